@@ -0,0 +1,921 @@
+"""
+═══════════════════════════════════════════════════════════════
+        📊 QUIZ EARN BOT BENCHMARKS
+        Usage: python benchmark.py [name ...]
+        Every benchmark works on throwaway SQLite files
+═══════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import asyncio
+import time
+import itertools
+import json
+import collections
+import sqlite3
+import tempfile
+import tracemalloc
+import statistics
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+# Keep the module level database of bot.py out of the working tree
+WORK_DIR = tempfile.mkdtemp(prefix="quiz_bot_bench_")
+os.environ.setdefault("DATABASE_PATH", os.path.join(WORK_DIR, "bot.db"))
+
+import bot  # noqa: E402
+from telegram.ext import ExtBot, TypeHandler  # noqa: E402
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """Register a benchmark under a command line name"""
+    def register(func: Callable) -> Callable:
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func: Callable, iterations: int) -> List[float]:
+    """Run func repeatedly and return per-call latency in microseconds"""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def report(label: str, samples: List[float]):
+    """Print mean / p50 / p99 for a list of microsecond samples"""
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"  {label:<40} mean {statistics.mean(ordered):>9.1f}µs  "
+        f"p50 {statistics.median(ordered):>9.1f}µs  p99 {p99:>9.1f}µs"
+    )
+
+
+def fresh_database(name: str) -> "bot.Database":
+    """Create an empty Database in the benchmark work dir"""
+    return bot.Database(os.path.join(WORK_DIR, f"{name}.db"))
+
+
+def seed_users(database: "bot.Database", count: int):
+    """Insert count users with a starting balance"""
+    for user_id in range(1, count + 1):
+        database.add_user(user_id, f"User {user_id}")
+    for user_id in range(1, count + 1):
+        database.update_balance(user_id, 100.0)
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🗄️ CONNECTION POOL
+# ═══════════════════════════════════════════════════════════════
+
+def legacy_connection(db_name: str) -> sqlite3.Connection:
+    """The pre-pool Database.get_connection: connect + PRAGMAs per call"""
+    conn = sqlite3.connect(db_name)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@benchmark("connections")
+def bench_connections(iterations: int = 2000, users: int = 500):
+    """Per-call latency of get_user / get_setting / update_balance"""
+    database = fresh_database("connections")
+    seed_users(database, users)
+    db_name = database.db_name
+    
+    def legacy_get_user(i):
+        conn = legacy_connection(db_name)
+        try:
+            row = conn.execute("SELECT * FROM users WHERE user_id = ?", (i % users + 1,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    def legacy_get_setting(i):
+        conn = legacy_connection(db_name)
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE key = ?", ("quiz_cost",)).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+    
+    def legacy_update_balance(i):
+        conn = legacy_connection(db_name)
+        try:
+            conn.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (0.01, i % users + 1))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    print(f"connections: {iterations} calls each, {users} users")
+    report("get_user (connect per call)", measure(legacy_get_user, iterations))
+    report("get_user (pooled + user cache)", measure(lambda i: database.get_user(i % users + 1), iterations))
+    report("get_setting (connect per call)", measure(legacy_get_setting, iterations))
+    report("get_setting (settings snapshot)", measure(lambda i: database.get_setting("quiz_cost"), iterations))
+    report("update_balance (connect per call)", measure(legacy_update_balance, iterations))
+    report("update_balance (pooled)", measure(lambda i: database.update_balance(i % users + 1, 0.01), iterations))
+    database.pool.close()
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🧠 QUIZ SELECTION
+# ═══════════════════════════════════════════════════════════════
+
+def seed_quizzes(database: "bot.Database", count: int):
+    """Bulk insert count quizzes straight through the writer"""
+    now = "2024-01-01 00:00:00"
+    rows = ((f"Question {i}?", "A", "B", "C", "D", 1, now) for i in range(count))
+    with database.pool.writer() as cursor:
+        cursor.executemany(
+            """INSERT INTO quiz (question, option1, option2, option3, option4, correct_option, added_date)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+    database.load_quiz_ids()
+
+
+@benchmark("quiz-selection")
+def bench_quiz_selection(sizes=(10_000, 100_000, 1_000_000), answered: int = 200):
+    """ORDER BY RANDOM() NOT IN vs QuizSelector at growing quiz banks"""
+    print(f"quiz-selection: user with {answered} answered quizzes")
+    for size in sizes:
+        database = fresh_database(f"quiz_selection_{size}")
+        seed_quizzes(database, size)
+        database.add_user(1, "Player")
+        for quiz_id in range(1, answered + 1):
+            database.answer_quiz(1, quiz_id, True)
+        
+        def legacy_pick(i):
+            with database.pool.reader() as cursor:
+                cursor.execute(
+                    """SELECT * FROM quiz WHERE quiz_id NOT IN
+                       (SELECT quiz_id FROM user_quiz_answered WHERE user_id = ?)
+                       ORDER BY RANDOM() LIMIT 1""",
+                    (1,)
+                )
+                return cursor.fetchone()
+        
+        legacy_runs = max(3, 200_000 // size)
+        print(f" {size:>9,} quizzes")
+        report("ORDER BY RANDOM() NOT IN", measure(legacy_pick, legacy_runs))
+        report("QuizSelector (first call, loads user)", measure(lambda i: database.get_unanswered_quiz(1), 1))
+        report("QuizSelector", measure(lambda i: database.get_unanswered_quiz(1), 2000))
+        database.pool.close()
+
+
+# ═══════════════════════════════════════════════════════════════
+# 📝 QUIZ IMPORT
+# ═══════════════════════════════════════════════════════════════
+
+def quiz_file(count: int, prefix: str = "Question") -> str:
+    """Build an upload in the admin TXT format"""
+    blocks = [
+        f"{prefix} {i}?\n1|Option A\n2|Option B\n3|Option C\n4|Option D\nANS:{i % 4 + 1}"
+        for i in range(count)
+    ]
+    return "\n---\n".join(blocks)
+
+
+@benchmark("quiz-import")
+def bench_quiz_import(count: int = 5000):
+    """add_quiz per question vs add_quizzes in one transaction"""
+    parsed = [bot.parse_quiz_block(block) for block in quiz_file(count).split("---")]
+    print(f"quiz-import: {count} parsed questions")
+    
+    database = fresh_database("quiz_import_single")
+    start = time.perf_counter()
+    for question, options, correct in parsed:
+        database.add_quiz(question, options, correct)
+    elapsed = time.perf_counter() - start
+    print(f"  {'add_quiz per question':<40} {elapsed:>8.2f}s  {count / elapsed:>10,.0f} questions/s")
+    database.pool.close()
+    
+    database = fresh_database("quiz_import_bulk")
+    start = time.perf_counter()
+    result = database.add_quizzes(parsed)
+    elapsed = time.perf_counter() - start
+    print(f"  {'add_quizzes (one transaction)':<40} {elapsed:>8.2f}s  {count / elapsed:>10,.0f} questions/s")
+    
+    start = time.perf_counter()
+    again = database.add_quizzes(parsed)
+    elapsed = time.perf_counter() - start
+    print(f"  {'add_quizzes (all duplicates)':<40} {elapsed:>8.2f}s  {count / elapsed:>10,.0f} questions/s")
+    print(f"  first import {result}, re-import {again}")
+    database.pool.close()
+
+
+# ═══════════════════════════════════════════════════════════════
+# 📢 CHANNEL MEMBERSHIP
+# ═══════════════════════════════════════════════════════════════
+
+FAKE_API_DELAY = float(os.getenv("FAKE_API_DELAY", "0.05"))
+
+
+class FakeMembershipBot:
+    """Stands in for the Bot API: get_chat_member answers after a delay"""
+    
+    def __init__(self, delay: float = FAKE_API_DELAY, slow_channels: Dict[int, float] = None):
+        self.delay = delay
+        self.slow_channels = slow_channels or {}
+        self.calls = 0
+    
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        self.calls += 1
+        await asyncio.sleep(self.slow_channels.get(chat_id, self.delay))
+        return SimpleNamespace(status=bot.ChatMemberStatus.MEMBER)
+
+
+async def legacy_check_all(fake_bot, user_id: int):
+    """The pre-concurrency loop: one channel after another"""
+    channels = await bot.db.get_channels()
+    not_joined = []
+    for channel in channels:
+        member = await fake_bot.get_chat_member(chat_id=channel["channel_id"], user_id=user_id)
+        if member.status != bot.ChatMemberStatus.MEMBER:
+            not_joined.append(channel["channel_id"])
+    return not not_joined, not_joined
+
+
+@benchmark("membership")
+def bench_membership(channels: int = 5, iterations: int = 20):
+    """Sequential vs concurrent /start membership checks against a delayed fake API"""
+    for channel in bot.database.get_channels():
+        bot.database.remove_channel(channel["channel_id"])
+    channel_ids = [-1000000000001 - i for i in range(channels)]
+    for channel_id in channel_ids:
+        bot.database.add_channel(channel_id)
+    
+    user_ids = itertools.count(10_000_000)
+    
+    async def run(check, fake_bot) -> List[float]:
+        samples = []
+        for _ in range(iterations):
+            user_id = next(user_ids)  # fresh user, so the membership cache always misses
+            start = time.perf_counter()
+            await check(fake_bot, user_id)
+            samples.append((time.perf_counter() - start) * 1_000_000)
+        return samples
+    
+    async def concurrent(fake_bot, user_id):
+        return await bot.check_all_channels_membership(fake_bot, user_id)
+    
+    async def main():
+        print(f"membership: {channels} channels, fake API delay {FAKE_API_DELAY * 1000:.0f}ms, "
+              f"cap {bot.MEMBERSHIP_CHECK_CONCURRENCY}, timeout {bot.MEMBERSHIP_CHECK_TIMEOUT}s")
+        report("sequential (old loop)", await run(legacy_check_all, FakeMembershipBot()))
+        report("concurrent", await run(concurrent, FakeMembershipBot()))
+        
+        slow = FakeMembershipBot(slow_channels={channel_ids[-1]: bot.MEMBERSHIP_CHECK_TIMEOUT * 2})
+        start = time.perf_counter()
+        all_joined, not_joined = await bot.check_all_channels_membership(slow, next(user_ids))
+        print(f"  one channel slower than the timeout: {time.perf_counter() - start:.2f}s, "
+              f"partial result not_joined={not_joined}")
+        
+        warm = FakeMembershipBot()
+        user_id = next(user_ids)
+        await bot.check_all_channels_membership(warm, user_id)
+        start = time.perf_counter()
+        await bot.check_all_channels_membership(warm, user_id)
+        print(f"  warm membership cache: {(time.perf_counter() - start) * 1_000_000:.0f}µs, "
+              f"{warm.calls} API calls for two checks")
+    
+    asyncio.run(main())
+
+
+class FakeInviteBot(FakeMembershipBot):
+    """Fake Bot API for invite links: channels have no primary link, so every lookup mints one"""
+    
+    def __init__(self, delay: float = FAKE_API_DELAY):
+        super().__init__(delay)
+        self.minted = 0
+    
+    async def get_chat(self, chat_id: int):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(id=chat_id, invite_link=None)
+    
+    async def create_chat_invite_link(self, chat_id: int):
+        self.calls += 1
+        self.minted += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(invite_link=f"https://t.me/+fake{self.minted}")
+
+
+async def legacy_invite_link(fake_bot, channel_id: int) -> str:
+    """The pre-cache get_channel_invite_link: get_chat + create per call"""
+    chat = await fake_bot.get_chat(channel_id)
+    if chat.invite_link:
+        return chat.invite_link
+    return (await fake_bot.create_chat_invite_link(channel_id)).invite_link
+
+
+@benchmark("invite-links")
+def bench_invite_links(channels: int = 5, iterations: int = 20):
+    """Force join screen links: Bot API per /start vs stored links"""
+    for channel in bot.database.get_channels():
+        bot.database.remove_channel(channel["channel_id"])
+    for i in range(channels):
+        bot.database.add_channel(-1000000000101 - i)
+    
+    async def main():
+        print(f"invite-links: {channels} unjoined channels, fake API delay {FAKE_API_DELAY * 1000:.0f}ms")
+        legacy = FakeInviteBot()
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            for channel in await bot.db.get_channels():
+                await legacy_invite_link(legacy, channel["channel_id"])
+            samples.append((time.perf_counter() - start) * 1_000_000)
+        report("get_chat + create per /start", samples)
+        print(f"  {legacy.calls} API calls, {legacy.minted} links minted")
+        
+        cached = FakeInviteBot()
+        await bot.refresh_invite_links(cached)
+        refresh_calls = cached.calls
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            for channel in await bot.db.get_channels():
+                bot.get_channel_invite_link(channel)
+            samples.append((time.perf_counter() - start) * 1_000_000)
+        report("stored links", samples)
+        await bot.refresh_invite_links(cached)
+        print(f"  {refresh_calls} API calls to fill the cache, {cached.calls - refresh_calls} during "
+              f"{iterations} screens + a second refresh pass, {cached.minted} links minted")
+    
+    asyncio.run(main())
+
+
+# ═══════════════════════════════════════════════════════════════
+# 👥 BOT API CALLS PER HANDLER
+# ═══════════════════════════════════════════════════════════════
+
+class CountingBot:
+    """Records every outbound Bot API method; any call answers instantly"""
+    
+    def __init__(self, username: str = "QuizEarnBenchBot"):
+        self.username = username
+        self.calls: List[str] = []
+    
+    def __getattr__(self, method: str):
+        async def call(*args, **kwargs):
+            self.calls.append(method)
+            return SimpleNamespace(username=self.username, invite_link=None)
+        return call
+
+
+def callback_update(fake_bot: CountingBot, user_id: int) -> SimpleNamespace:
+    """A callback query update whose answer / edit go through the counting bot"""
+    query = SimpleNamespace(
+        from_user=SimpleNamespace(id=user_id, full_name=f"User {user_id}", username=None),
+        answer=fake_bot.answer_callback_query,
+        edit_message_text=fake_bot.edit_message_text
+    )
+    return SimpleNamespace(callback_query=query, effective_user=query.from_user)
+
+
+async def legacy_refer_earn(update, context):
+    """The pre-cache referral screen: get_me on every tap"""
+    query = update.callback_query
+    await query.answer()
+    await bot.db.get_user(query.from_user.id)
+    bot_info = await context.bot.get_me()
+    ref_link = f"https://t.me/{bot_info.username}?start={query.from_user.id}"
+    await query.edit_message_text(ref_link)
+
+
+@benchmark("api-calls")
+def bench_api_calls(taps: int = 100):
+    """Outbound Bot API calls per handler invocation; fails if Refer & Earn calls get_me"""
+    bot.database.add_user(42, "Referrer")
+    handlers = {
+        "refer_earn (get_me per tap)": legacy_refer_earn,
+        "refer_earn": bot.refer_earn_callback,
+        "leaderboard": bot.leaderboard_callback,
+        "profile": bot.profile_callback
+    }
+    
+    async def main():
+        print(f"api-calls: {taps} taps per handler")
+        for label, handler in handlers.items():
+            fake_bot = CountingBot()
+            context = SimpleNamespace(
+                bot=fake_bot,
+                bot_data={"referral_links": bot.ReferralLinks(fake_bot.username)},
+                user_data={}
+            )
+            for _ in range(taps):
+                await handler(callback_update(fake_bot, 42), context)
+            per_tap = {method: fake_bot.calls.count(method) / taps for method in sorted(set(fake_bot.calls))}
+            print(f"  {label:<40} {len(fake_bot.calls) / taps:.1f} calls/tap  {per_tap}")
+            if handler is bot.refer_earn_callback:
+                assert "get_me" not in fake_bot.calls, "refer_earn_callback must not call get_me"
+                assert len(fake_bot.calls) == 2 * taps, "refer_earn_callback: answer + edit only"
+    
+    asyncio.run(main())
+
+
+# ═══════════════════════════════════════════════════════════════
+# 📡 BROADCAST
+# ═══════════════════════════════════════════════════════════════
+
+class FakeFloodBot:
+    """Fake Bot API that enforces a per-second send limit and answers 429 beyond it"""
+    
+    def __init__(self, limit: int = 30, delay: float = FAKE_API_DELAY, retry_after: int = 1):
+        self.limit = limit
+        self.delay = delay
+        self.retry_after = retry_after
+        self.window: "collections.deque[float]" = collections.deque()
+        self.delivered: List[int] = []
+        self.rejected = 0
+    
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(self.delay)
+        now = time.monotonic()
+        while self.window and self.window[0] <= now - 1:
+            self.window.popleft()
+        if len(self.window) >= self.limit:
+            self.rejected += 1
+            raise bot.RetryAfter(self.retry_after)
+        self.window.append(now)
+        self.delivered.append(chat_id)
+
+
+async def legacy_broadcast(fake_bot, chat_ids: List[int]):
+    """The pre-engine loop: one send at a time plus a fixed 50ms sleep"""
+    for chat_id in chat_ids:
+        try:
+            await fake_bot.send_message(chat_id=chat_id, text="hi")
+        except Exception:
+            pass
+        await asyncio.sleep(0.05)
+
+
+@benchmark("broadcast")
+def bench_broadcast(legacy_users: int = 60, users: int = 300):
+    """Sequential broadcast vs BroadcastEngine against a fake 30 msg/s Bot API"""
+    async def main():
+        print(f"broadcast: fake API allows 30 msg/s, {FAKE_API_DELAY * 1000:.0f}ms per call")
+        
+        fake_bot = FakeFloodBot()
+        start = time.perf_counter()
+        await legacy_broadcast(fake_bot, list(range(legacy_users)))
+        elapsed = time.perf_counter() - start
+        print(f"  {'sequential + sleep(0.05)':<40} {legacy_users / elapsed:>6.1f} msg/s  "
+              f"{len(fake_bot.delivered)}/{legacy_users} delivered")
+        
+        runs = [
+            (f"engine ({bot.BROADCAST_RATE:.0f}/s bucket)", bot.TokenBucket()),
+            ("engine (60/s bucket, forces 429s)", bot.TokenBucket(rate=60, capacity=20))
+        ]
+        for label, limiter in runs:
+            fake_bot = FakeFloodBot()
+            engine = bot.BroadcastEngine(fake_bot, "hi", limiter=limiter)
+            await engine.run(range(users))
+            print(f"  {label:<40} {engine.rate:>6.1f} msg/s  {len(fake_bot.delivered)}/{users} delivered, "
+                  f"{fake_bot.rejected} x 429, failed {engine.failed} {engine.errors}")
+            assert sorted(fake_bot.delivered) == list(range(users)), "every user gets exactly one message"
+    
+    asyncio.run(main())
+
+
+@benchmark("recipients")
+def bench_recipients(users: int = 200_000):
+    """Peak memory / time of get_all_users vs the keyset recipient stream"""
+    with bot.database.pool.writer() as cursor:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO users (user_id, name, join_date) VALUES (?, ?, ?)",
+            ((1_000_000 + i, f"User {i}", "2024-01-01 00:00:00") for i in range(users))
+        )
+    
+    async def legacy():
+        rows = await bot.db.get_all_users()
+        count = 0
+        for _ in sorted(row["user_id"] for row in rows):
+            count += 1
+        return count
+    
+    async def keyset():
+        count = 0
+        async for _ in bot.iter_broadcast_recipients():
+            count += 1
+        return count
+    
+    print(f"recipients: {users:,} users, page size {bot.BROADCAST_PAGE_SIZE}")
+    for label, walk in (("get_all_users", legacy), ("keyset pages of user_id", keyset)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = asyncio.run(walk())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:<40} {elapsed:>6.2f}s  peak {peak / 1024 / 1024:>8.1f} MiB  {count:,} ids")
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🌐 WEBHOOK
+# ═══════════════════════════════════════════════════════════════
+
+class OfflineBot(ExtBot):
+    """ExtBot whose Bot API calls are answered locally after api_delay seconds"""
+    
+    def __init__(self, api_delay: float = 0.0):
+        super().__init__("123456:BENCHMARK")
+        self._api_delay = api_delay  # Bot objects are frozen, underscore names stay settable
+    
+    async def _do_post(self, endpoint: str, data, **kwargs):
+        if self._api_delay:
+            await asyncio.sleep(self._api_delay)
+        if endpoint == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        return True
+
+
+def callback_update_json(update_id: int, user_id: int, data: str = "leaderboard") -> bytes:
+    """Telegram-shaped callback query update"""
+    return json.dumps({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "text": "menu"
+            }
+        }
+    }).encode()
+
+
+async def post_updates(port: int, bodies: List[bytes], sent_at: Dict[int, float],
+                       secret: str, connections: int = 40) -> Dict[int, int]:
+    """Post bodies over keep-alive connections (Telegram's default is 40); returns status counts"""
+    statuses: Dict[int, int] = {}
+    chunks = [bodies[i::connections] for i in range(connections)]
+    
+    async def client(chunk: List[bytes]):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for body in chunk:
+            sent_at[json.loads(body)["update_id"]] = time.perf_counter()
+            writer.write(
+                (f"POST /telegram HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                 f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+    
+    await asyncio.gather(*(client(chunk) for chunk in chunks if chunk))
+    return statuses
+
+
+@benchmark("webhook")
+def bench_webhook(updates: int = 2000, api_delay: float = 0.002):
+    """Load test: synthetic callback updates posted to a local webhook instance"""
+    
+    async def scenario(label: str, count: int, queue_size: int, secret: str = "bench-secret") -> Dict[int, int]:
+        bot.UPDATE_QUEUE_SIZE = queue_size
+        application = bot.setup_application(bot=OfflineBot(api_delay))
+        sent_at: Dict[int, float] = {}
+        handled_at: Dict[int, float] = {}
+        
+        async def record(update, context):
+            handled_at[update.update_id] = time.perf_counter()
+        
+        application.add_handler(TypeHandler(bot.Update, record), group=1)
+        server = bot.WebhookServer(application, secret="bench-secret", host="127.0.0.1", port=0)
+        
+        async with application:
+            await application.start()
+            await server.start()
+            start = time.perf_counter()
+            bodies = [callback_update_json(i, 1 + i % 500) for i in range(count)]
+            statuses = await post_updates(server.port, bodies, sent_at, secret)
+            accepted = statuses.get(200, 0)
+            while len(handled_at) < accepted:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            await server.stop()
+            await application.stop()
+        
+        latencies = sorted((handled_at[i] - sent_at[i]) * 1000 for i in handled_at)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+        max_pending = application.update_queue.max_pending
+        print(f"  {label:<40} {accepted / elapsed:>7.0f} updates/s  p50 "
+              f"{statistics.median(latencies) if latencies else 0:>7.1f}ms  p99 {p99:>7.1f}ms  "
+              f"max pending {max_pending:>4}  responses {statuses}")
+        assert max_pending <= queue_size, "queued + in-flight updates must stay within UPDATE_QUEUE_SIZE"
+        return statuses
+    
+    async def main():
+        print(f"webhook: {updates} callback updates over 40 connections, Bot API answered in {api_delay * 1000:.0f}ms")
+        await scenario(f"queue {bot.UPDATE_QUEUE_SIZE}", updates, bot.UPDATE_QUEUE_SIZE)
+        statuses = await scenario("queue 20 (503 whenever full)", updates, 20)
+        assert statuses.get(503), "an overloaded webhook must shed load with 503"
+        statuses = await scenario("wrong secret (expect 403s)", 100, 1000, secret="nope")
+        assert statuses == {403: 100}, "a wrong secret must be rejected"
+    
+    queue_size = bot.UPDATE_QUEUE_SIZE
+    try:
+        asyncio.run(main())
+    finally:
+        bot.UPDATE_QUEUE_SIZE = queue_size
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🔀 CONCURRENT UPDATES
+# ═══════════════════════════════════════════════════════════════
+
+@benchmark("concurrency")
+def bench_concurrency(user_counts=(1, 8, 64), taps: int = 10, api_delay: float = 0.02, queue_size: int = 100):
+    """Sequential vs per-user serialized update processing; checks per-user order and bounded admission"""
+    for user_id in range(1, max(user_counts) + 1):
+        bot.database.add_user(user_id, f"User {user_id}")
+    
+    async def run(users: int, concurrency: int) -> Tuple[float, int]:
+        bot.UPDATE_CONCURRENCY = concurrency
+        bot.UPDATE_QUEUE_SIZE = queue_size
+        application = bot.setup_application(bot=OfflineBot(api_delay))
+        handled: Dict[int, List[int]] = {}
+        count = users * taps
+        finished = asyncio.Event()
+        
+        async def record(update, context):
+            handled.setdefault(update.effective_user.id, []).append(update.update_id)
+            if sum(len(ids) for ids in handled.values()) == count:
+                finished.set()
+        
+        application.add_handler(TypeHandler(bot.Update, record), group=1)
+        max_tasks = 0
+        async with application:
+            await application.start()
+            start = time.perf_counter()
+            # Polling-style producer: put() waits while queued + in-flight updates fill the queue
+            for update_id in range(count):
+                body = json.loads(callback_update_json(update_id, 1 + update_id % users, "profile"))
+                await application.update_queue.put(bot.Update.de_json(body, application.bot))
+                max_tasks = max(max_tasks, len(asyncio.all_tasks()))
+            await finished.wait()
+            elapsed = time.perf_counter() - start
+            await application.stop()
+        
+        for ids in handled.values():
+            assert ids == sorted(ids), "one user's updates must be handled in arrival order"
+        assert application.update_queue.max_pending <= queue_size, "admission must stay bounded"
+        return count / elapsed, max_tasks
+    
+    async def main():
+        print(f"concurrency: {taps} profile taps per user, Bot API answered in {api_delay * 1000:.0f}ms, "
+              f"queue {queue_size}")
+        for users in user_counts:
+            sequential, _ = await run(users, 1)
+            concurrent, max_tasks = await run(users, concurrency)
+            print(f"  {users:>3} users  sequential {sequential:>7.1f} updates/s   "
+                  f"per-user serialized ({concurrency}) {concurrent:>7.1f} updates/s   max tasks {max_tasks}")
+    
+    concurrency, previous_queue_size = bot.UPDATE_CONCURRENCY, bot.UPDATE_QUEUE_SIZE
+    try:
+        asyncio.run(main())
+    finally:
+        bot.UPDATE_CONCURRENCY, bot.UPDATE_QUEUE_SIZE = concurrency, previous_queue_size
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🎨 MESSAGE RENDERING
+# ═══════════════════════════════════════════════════════════════
+
+def legacy_escape(text: str) -> str:
+    """The original escape_markdown: one str.replace per special character"""
+    for char in ['_', '*', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']:
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def legacy_format_balance(amount: float) -> str:
+    """The original format_balance, sent without escaping its '.'"""
+    return f"{amount:.2f}৳"
+
+
+def escaped_balance(amount: float) -> str:
+    return legacy_escape(legacy_format_balance(amount))
+
+
+@benchmark("render")
+def bench_render(iterations: int = 20000):
+    """Per-message render cost: the original f-strings vs templates, outputs checked against escaped f-strings"""
+    names = {
+        "plain name": "Rahim Uddin",
+        "bengali name": "রহিম উদ্দিন",
+        "name full of specials": "Md. Rahim_Uddin (Official) [BD]!"
+    }
+    name = names["plain name"]
+    question = "বাংলাদেশের রাজধানী কোনটি? (Choose 1-4) #quiz"
+    profile = {
+        "name": name, "user_id": 123456789, "balance": 12.5, "referral_count": 7, "quiz_played": 42,
+        "correct_answers": 30, "wrong_answers": 12, "total_earned": 1.5, "total_spent": 0.84,
+        "join_date": "2024-01-01 10:00:00"
+    }
+    fmt = bot.format_balance
+    
+    # money / text: how the original code rendered balances and dates (unescaped); the check passes
+    # escaped_balance / legacy_escape to get the expected, valid MarkdownV2
+    def legacy_main_menu(i, money=legacy_format_balance, text=str):
+        return (
+            f"👋 *স্বাগতম আবার, {legacy_escape(name)}\\!*\n\n"
+            "🔥 *Premium Quiz Earn Bot Main Menu*\n\n"
+            "🧠 Quiz খেলে টাকা আয় করুন\n"
+            "👥 Refer করে Bonus পান\n"
+            "💰 Withdraw করুন সহজেই"
+        )
+    
+    def legacy_back_menu(i, money=legacy_format_balance, text=str):
+        return (
+            f"👋 *স্বাগতম আবার, {legacy_escape(name)}\\!*\n\n"
+            f"🔥 *Premium Quiz Earn Bot Main Menu*\n\n"
+            f"💰 Balance: {money(profile['balance'])}\n\n"
+            f"🧠 Quiz খেলে টাকা আয় করুন\n"
+            f"👥 Refer করে Bonus পান\n"
+            f"💰 Withdraw করুন সহজেই"
+        )
+    
+    def legacy_quiz_card(i, money=legacy_format_balance, text=str):
+        return (
+            f"🧠 *Quiz Time\\!*\n\n"
+            f"❓ *Question:*\n{legacy_escape(question)}\n\n"
+            f"💰 Reward: {money(0.05)}\n"
+            f"💸 Cost: {money(0.02)}"
+        )
+    
+    def legacy_profile(i, money=legacy_format_balance, text=str):
+        return (
+            f"👤 *Your Profile*\n\n"
+            f"🧑 Name: {legacy_escape(profile['name'])}\n"
+            f"🆔 User ID: `{profile['user_id']}`\n"
+            f"💰 Balance: {money(profile['balance'])}\n"
+            f"👥 Total Referral: {profile['referral_count']}\n"
+            f"🧠 Quiz Played: {profile['quiz_played']}\n"
+            f"✅ Correct Answers: {profile['correct_answers']}\n"
+            f"❌ Wrong Answers: {profile['wrong_answers']}\n"
+            f"💵 Quiz Earned: {money(profile['total_earned'])}\n"
+            f"💸 Quiz Spent: {money(profile['total_spent'])}\n"
+            f"📅 Join Date: {text(profile['join_date'])}"
+        )
+    
+    def legacy_withdraw_confirm(i, money=legacy_format_balance, text=str):
+        return (
+            f"💳 *Withdraw Confirmation*\n\n"
+            f"💰 Amount: {money(50.0)}\n"
+            f"💸 Fee: {money(2.0)}\n"
+            f"💵 You'll Get: {money(48.0)}\n"
+            f"📱 Method: {text('bKash')}\n"
+            f"📞 Number: `{text('01712345678')}`"
+        )
+    
+    cases = [
+        (f"escape_markdown ({label})", lambda i, value=value: legacy_escape(value),
+         lambda i, value=value: bot.escape_markdown.__wrapped__(value))
+        for label, value in names.items()
+    ] + [
+        ("main menu", legacy_main_menu, lambda i: bot.render_message("main_menu", name=name)),
+        ("back to menu", legacy_back_menu, lambda i: bot.render_message(
+            "back_menu", name=name, balance=fmt(profile["balance"]))),
+        ("quiz card", legacy_quiz_card, lambda i: bot.render_message(
+            "quiz_card", question=question, reward=fmt(0.05), cost=fmt(0.02))),
+        ("profile", legacy_profile, lambda i: bot.render_message(
+            "profile",
+            name=profile["name"],
+            user_id=profile["user_id"],
+            balance=fmt(profile["balance"]),
+            referral_count=profile["referral_count"],
+            quiz_played=profile["quiz_played"],
+            correct_answers=profile["correct_answers"],
+            wrong_answers=profile["wrong_answers"],
+            total_earned=fmt(profile["total_earned"]),
+            total_spent=fmt(profile["total_spent"]),
+            join_date=profile["join_date"]
+        )),
+        ("withdraw confirm", legacy_withdraw_confirm, lambda i: bot.render_message(
+            "withdraw_confirm", amount=fmt(50.0), fee=fmt(2.0), final_amount=fmt(48.0),
+            method="bKash", number="01712345678"))
+    ]
+    
+    print(f"render: {iterations} renders per message type (escape_markdown rows bypass its LRU)")
+    for label, legacy, current in cases:
+        if label.startswith("escape_markdown"):
+            assert legacy(0) == current(0), label
+        else:
+            assert legacy(0, escaped_balance, legacy_escape) == current(0), label
+        report(f"{label} (original)", measure(legacy, iterations))
+        report(f"{label} (current)", measure(current, iterations))
+
+
+# ═══════════════════════════════════════════════════════════════
+# ⌨️ KEYBOARDS
+# ═══════════════════════════════════════════════════════════════
+
+class RecordingBot(CountingBot):
+    """Counting bot that keeps every outgoing reply_markup, like a backlog of queued requests"""
+    
+    def __init__(self):
+        super().__init__()
+        self.markups: List[object] = []
+    
+    async def edit_message_text(self, *args, reply_markup=None, **kwargs):
+        self.calls.append("edit_message_text")
+        self.markups.append(reply_markup)
+
+
+def rebuild_keyboard(markup: "bot.InlineKeyboardMarkup") -> "bot.InlineKeyboardMarkup":
+    """A fresh copy of a keyboard, as the handlers built them before the registry"""
+    return bot.InlineKeyboardMarkup([
+        [bot.InlineKeyboardButton(button.text, callback_data=button.callback_data, url=button.url) for button in row]
+        for row in markup.inline_keyboard
+    ])
+
+
+class RebuildingKeyboards(dict):
+    """STATIC_KEYBOARDS stand-in that hands out a new keyboard on every lookup"""
+    
+    def __getitem__(self, name: str):
+        return rebuild_keyboard(super().__getitem__(name))
+
+
+@benchmark("keyboards")
+def bench_keyboards(quizzes: int = 200, users: int = 50, rounds: int = 40):
+    """Allocation per update of the quiz / menu loop with per-call keyboards vs the keyboard registry"""
+    seed_quizzes(bot.database, quizzes)
+    user_ids = [5_000 + i for i in range(users)]
+    for user_id in user_ids:
+        bot.database.add_user(user_id, f"User {user_id}")
+        bot.database.update_balance(user_id, 1_000_000)
+    handlers = (bot.play_quiz_callback, bot.skip_quiz_callback, bot.back_menu_callback)
+    registry = (bot.STATIC_KEYBOARDS, bot.get_main_menu_keyboard, bot.quiz_keyboards)
+    per_call = (
+        RebuildingKeyboards(bot.STATIC_KEYBOARDS),
+        bot.build_main_menu_keyboard,
+        bot.QuizKeyboardCache(max_size=0)
+    )
+    
+    async def session(fake_bot: RecordingBot):
+        contexts = {user_id: SimpleNamespace(bot=fake_bot, bot_data={}, user_data={}) for user_id in user_ids}
+        for _ in range(rounds):
+            for user_id in user_ids:
+                for handler in handlers:
+                    await handler(callback_update(fake_bot, user_id), contexts[user_id])
+    
+    print(f"keyboards: {users} users x {rounds} rounds of play / skip / menu over {quizzes} quizzes")
+    for label, (static, main_menu, quiz_cache) in (("keyboards built per call", per_call), ("keyboard registry", registry)):
+        bot.STATIC_KEYBOARDS, bot.get_main_menu_keyboard, bot.quiz_keyboards = static, main_menu, quiz_cache
+        fake_bot = RecordingBot()
+        asyncio.run(session(fake_bot))  # warm the quiz keyboard LRU and the user cache
+        fake_bot = RecordingBot()
+        tracemalloc.start()
+        start = time.perf_counter()
+        asyncio.run(session(fake_bot))
+        elapsed = time.perf_counter() - start
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        updates = len(fake_bot.markups)
+        distinct = len({id(markup) for markup in fake_bot.markups})
+        print(f"  {label:<40} {retained / updates:>7.0f} B/update  {distinct:>6} distinct keyboards"
+              f"  {elapsed / updates * 1e6:>6.0f}µs/update")
+    bot.STATIC_KEYBOARDS, bot.get_main_menu_keyboard, bot.quiz_keyboards = registry
+    print(f"  quiz keyboard LRU: {bot.quiz_keyboards.hits} hits / {bot.quiz_keyboards.misses} misses")
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🚀 ENTRY POINT
+# ═══════════════════════════════════════════════════════════════
+
+def main():
+    """Run the benchmarks named on the command line (default: all)"""
+    names = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(BENCHMARKS)}")
+        sys.exit(2)
+    
+    for name in names:
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,30 @@
 """
 
 import os
+import queue
+import random
+import secrets
 import sqlite3
+import sys
 import logging
 import asyncio
+import bisect
+import hmac
+import json
+import signal
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from io import BytesIO
+from string import Formatter
+from types import MappingProxyType
 
 from telegram import (
     Update,
@@ -24,13 +42,17 @@ from telegram import (
     User as TGUser
 )
 from telegram.constants import ParseMode, ChatMemberStatus
+from telegram.error import BadRequest, Forbidden, RetryAfter
 from telegram.ext import (
     Application,
+    BasePersistence,
+    BaseUpdateProcessor,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
     ConversationHandler,
     ContextTypes,
+    PersistenceInput,
     filters
 )
 
@@ -44,6 +66,54 @@ ADMIN_ID = int(os.getenv("ADMIN_ID", "123456789"))
 FORCE_CHANNEL_IDS = os.getenv("FORCE_CHANNEL_IDS", "-1001234567890,-1001234567891")
 WITHDRAW_CHANNEL_ID = int(os.getenv("WITHDRAW_CHANNEL_ID", "-1001234567892"))
 
+# Update Delivery Config ("polling" or "webhook")
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public HTTPS URL Telegram posts to, path included
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8443")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # random per start when unset
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", str(1024 * 1024)))
+WEBHOOK_IDLE_TIMEOUT = float(os.getenv("WEBHOOK_IDLE_TIMEOUT", "75"))
+
+# Database Config
+DATABASE_PATH = os.getenv("DATABASE_PATH", "quiz_bot.db")
+DB_READER_CONNECTIONS = int(os.getenv("DB_READER_CONNECTIONS", "4"))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_READER_CONNECTIONS + 1)))
+DB_MAX_PENDING = int(os.getenv("DB_MAX_PENDING", "256"))
+QUIZ_SELECTOR_MAX_USERS = int(os.getenv("QUIZ_SELECTOR_MAX_USERS", "10000"))
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "10"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+QUIZ_KEYBOARD_CACHE_SIZE = int(os.getenv("QUIZ_KEYBOARD_CACHE_SIZE", "2048"))
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "5"))
+CONVERSATION_MAX_AGE = float(os.getenv("CONVERSATION_MAX_AGE", str(24 * 3600)))  # stored states older are dropped
+
+# Force Channel Membership Cache (seconds)
+MEMBERSHIP_POSITIVE_TTL = float(os.getenv("MEMBERSHIP_POSITIVE_TTL", "600"))
+MEMBERSHIP_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "30"))
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "100000"))
+MEMBERSHIP_CHECK_CONCURRENCY = int(os.getenv("MEMBERSHIP_CHECK_CONCURRENCY", "5"))
+MEMBERSHIP_CHECK_TIMEOUT = float(os.getenv("MEMBERSHIP_CHECK_TIMEOUT", "3"))
+
+# Invite Link Cache (seconds)
+INVITE_LINK_REFRESH_INTERVAL = float(os.getenv("INVITE_LINK_REFRESH_INTERVAL", "21600"))
+INVITE_LINK_CHECK_INTERVAL = float(os.getenv("INVITE_LINK_CHECK_INTERVAL", "60"))
+
+# Broadcast Config (Telegram allows ~30 messages/second per bot)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_BURST = float(os.getenv("BROADCAST_BURST", "5"))
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+BROADCAST_CHECKPOINT_INTERVAL = float(os.getenv("BROADCAST_CHECKPOINT_INTERVAL", "5"))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "1000"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "10"))
+
+# Quiz Upload Config
+QUIZ_IMPORT_BATCH_SIZE = int(os.getenv("QUIZ_IMPORT_BATCH_SIZE", "500"))
+QUIZ_IMPORT_PROGRESS_INTERVAL = float(os.getenv("QUIZ_IMPORT_PROGRESS_INTERVAL", "3"))
+
 # Parse Force Channel IDs
 FORCE_CHANNELS = [int(ch.strip()) for ch in FORCE_CHANNEL_IDS.split(",") if ch.strip()]
 
@@ -90,30 +160,421 @@ logger = logging.getLogger(__name__)
     STATE_ADMIN_SET_QUIZ_COST
 ) = range(18)
 
+# Quiz Answer Results
+QUIZ_SETTLED = "settled"
+QUIZ_ALREADY_ANSWERED = "already_answered"
+QUIZ_NOT_FOUND = "not_found"
+
+# Dashboard Stats Keys
+STAT_USERS = "users"
+STAT_BANNED_USERS = "banned_users"
+STAT_QUIZZES = "quizzes"
+STAT_ANSWERS = "answers"
+STAT_PENDING_WITHDRAWALS = "pending_withdrawals"
+STAT_PENDING_WITHDRAW_AMOUNT = "pending_withdraw_amount"
+STAT_TOTAL_BALANCE = "total_balance"
+STAT_UNDELIVERABLE = "undeliverable_users"
+
+# Broadcast Job Status
+BROADCAST_RUNNING = "running"
+BROADCAST_PAUSED = "paused"
+BROADCAST_CANCELLED = "cancelled"
+BROADCAST_COMPLETED = "completed"
+
 # ═══════════════════════════════════════════════════════════════
 # 🗄️ DATABASE HANDLER
 # ═══════════════════════════════════════════════════════════════
 
-class Database:
-    """Premium SQLite Database Handler"""
+class ConnectionPool:
+    """Long-lived SQLite connections: one writer plus a few readers"""
     
-    def __init__(self, db_name: str = "quiz_bot.db"):
+    def __init__(self, db_name: str, readers: int = DB_READER_CONNECTIONS):
         self.db_name = db_name
-        self.init_database()
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._after_commit = []
+        self._readers = queue.LifoQueue()
+        
+        for _ in range(max(1, readers)):
+            self._readers.put(self._connect())
     
-    def get_connection(self) -> sqlite3.Connection:
-        """Get database connection with row factory"""
-        conn = sqlite3.connect(self.db_name)
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection and apply the PRAGMAs once"""
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, isolation_level=None)
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA journal_mode=WAL")  # Better performance
         conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
         return conn
     
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Cursor]:
+        """Borrow a reader connection (autocommit, WAL snapshot per statement)"""
+        conn = self._readers.get()
+        cursor = conn.cursor()
+        
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            self._readers.put(conn)
+    
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Cursor]:
+        """Borrow the writer connection inside a single transaction"""
+        with self._write_lock:
+            cursor = self._writer.cursor()
+            
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    yield cursor
+                    cursor.execute("COMMIT")
+                except BaseException:
+                    self._rollback(cursor)
+                    raise
+                callbacks = self._after_commit
+            finally:
+                cursor.close()
+                self._after_commit = []
+            
+            # Still under the write lock, so in-memory mirrors apply in commit order
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"after_commit callback failed: {e}")
+    
+    def _rollback(self, cursor: sqlite3.Cursor):
+        """Best-effort ROLLBACK that never hides the error that caused it"""
+        if not self._writer.in_transaction:
+            return
+        try:
+            cursor.execute("ROLLBACK")
+        except sqlite3.Error as e:
+            logger.error(f"ROLLBACK failed: {e}")
+    
+    def after_commit(self, callback):
+        """Run callback once the current writer transaction commits (dropped on rollback)"""
+        self._after_commit.append(callback)
+    
+    def close(self):
+        """Close every pooled connection"""
+        with self._write_lock:
+            self._writer.close()
+        
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class SettingsSnapshot:
+    """Immutable view of the settings table, replaced whole on every update"""
+    
+    __slots__ = ("_values",)
+    
+    def __init__(self, values: Dict[str, str]):
+        object.__setattr__(self, "_values", MappingProxyType(dict(values)))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("SettingsSnapshot is immutable")
+    
+    def get(self, key: str) -> str:
+        """Get setting value (falls back to DEFAULT_SETTINGS)"""
+        value = self._values.get(key)
+        return value if value is not None else str(DEFAULT_SETTINGS.get(key, "0"))
+    
+    def replace(self, key: str, value: str) -> "SettingsSnapshot":
+        """New snapshot with one key changed"""
+        return SettingsSnapshot({**self._values, key: str(value)})
+
+
+class QuizSelector:
+    """Random unanswered quiz picker backed by in-memory quiz ids and per-user answered sets"""
+    
+    def __init__(self, max_users: int = QUIZ_SELECTOR_MAX_USERS, probes: int = 8):
+        self.max_users = max_users
+        self.probes = probes
+        self._lock = threading.Lock()
+        self._quiz_ids = array("q")
+        self._users: "OrderedDict[int, Dict]" = OrderedDict()
+    
+    def load_quizzes(self, quiz_ids: Iterable[int]):
+        """Replace the known quiz ids"""
+        with self._lock:
+            self._quiz_ids = array("q", quiz_ids)
+            self._users.clear()
+    
+    def add_quiz(self, quiz_id: int):
+        """Register a newly added quiz"""
+        with self._lock:
+            self._quiz_ids.append(quiz_id)
+            for entry in self._users.values():
+                if entry["deck"] is not None:
+                    entry["deck"].append(quiz_id)
+    
+    def add_quizzes(self, quiz_ids: Iterable[int]):
+        """Register a batch of newly added quizzes"""
+        quiz_ids = list(quiz_ids)
+        with self._lock:
+            self._quiz_ids.extend(quiz_ids)
+            for entry in self._users.values():
+                if entry["deck"] is not None:
+                    entry["deck"].extend(quiz_ids)
+    
+    def has_user(self, user_id: int) -> bool:
+        """Check if the user's answered set is loaded"""
+        with self._lock:
+            return user_id in self._users
+    
+    def load_user(self, user_id: int, answered_ids: Iterable[int]):
+        """Cache a user's answered quiz ids (LRU bounded)"""
+        with self._lock:
+            self._users[user_id] = {"answered": set(answered_ids), "deck": None}
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+    
+    def mark_answered(self, user_id: int, quiz_id: int):
+        """Keep a loaded user's answered set in sync"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                entry["answered"].add(quiz_id)
+    
+    def pick(self, user_id: int) -> Optional[int]:
+        """Pick a random unanswered quiz id for a loaded user"""
+        with self._lock:
+            entry = self._users[user_id]
+            self._users.move_to_end(user_id)
+            answered = entry["answered"]
+            quiz_ids = self._quiz_ids
+            
+            if len(answered) >= len(quiz_ids):
+                return None
+            
+            # Sparse history: a few random probes almost always hit
+            if entry["deck"] is None and len(answered) * 2 < len(quiz_ids):
+                for _ in range(self.probes):
+                    quiz_id = random.choice(quiz_ids)
+                    if quiz_id not in answered:
+                        return quiz_id
+            
+            # Dense history: keep a deck of what is left, pruned lazily
+            if entry["deck"] is None:
+                entry["deck"] = [quiz_id for quiz_id in quiz_ids if quiz_id not in answered]
+            
+            deck = entry["deck"]
+            while deck:
+                index = random.randrange(len(deck))
+                quiz_id = deck[index]
+                if quiz_id not in answered:
+                    return quiz_id
+                deck[index] = deck[-1]
+                deck.pop()
+            return None
+
+
+class ReferralLeaderboard:
+    """Top-N referrers kept sorted in memory, plus a Fenwick tree over referral counts for ranks"""
+    
+    def __init__(self, size: int = LEADERBOARD_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._top: List[Tuple[int, int]] = []  # sorted (-referral_count, user_id)
+        self._entries: Dict[int, Dict] = {}
+        self._tree = [0] * 65
+        self._ranked = 0
+    
+    def load(self, top_rows: Iterable[Dict], histogram: Iterable[Tuple[int, int]]):
+        """Seed from the users table (referral_count -> number of users)"""
+        with self._lock:
+            self._top = []
+            self._entries = {}
+            for row in top_rows:
+                self._insert_top(row["user_id"], row["name"], row["referral_count"])
+            
+            histogram = [(count, users) for count, users in histogram if count > 0]
+            capacity = 64
+            while histogram and capacity < max(count for count, _ in histogram):
+                capacity *= 2
+            self._tree = [0] * (capacity + 1)
+            self._ranked = 0
+            for count, users in histogram:
+                self._tree_add(count, users)
+    
+    def _tree_add(self, count: int, delta: int):
+        """Add delta users at referral count `count`"""
+        if count >= len(self._tree):
+            # Grow: rebuild a doubled tree from the current per-count totals
+            totals = [(c, self._tree_range(c)) for c in range(1, len(self._tree))]
+            capacity = len(self._tree) - 1
+            while capacity < count:
+                capacity *= 2
+            self._tree = [0] * (capacity + 1)
+            self._ranked = 0
+            for c, users in totals:
+                if users:
+                    self._tree_add(c, users)
+        
+        self._ranked += delta
+        while count < len(self._tree):
+            self._tree[count] += delta
+            count += count & -count
+    
+    def _tree_prefix(self, count: int) -> int:
+        """Users with 1..count referrals"""
+        total = 0
+        count = min(count, len(self._tree) - 1)
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+    
+    def _tree_range(self, count: int) -> int:
+        """Users with exactly `count` referrals"""
+        return self._tree_prefix(count) - self._tree_prefix(count - 1)
+    
+    def _insert_top(self, user_id: int, name: str, referral_count: int):
+        """Insert into the top list, dropping whoever falls off the end"""
+        key = (-referral_count, user_id)
+        if len(self._top) >= self.size and key > self._top[-1]:
+            return
+        
+        bisect.insort(self._top, key)
+        self._entries[user_id] = {"user_id": user_id, "name": name, "referral_count": referral_count}
+        if len(self._top) > self.size:
+            _, dropped = self._top.pop()
+            self._entries.pop(dropped, None)
+    
+    def on_increment(self, user_id: int, name: str, referral_count: int):
+        """Apply one referral_count increment (old count = referral_count - 1)"""
+        with self._lock:
+            if referral_count > 1:
+                self._tree_add(referral_count - 1, -1)
+            self._tree_add(referral_count, 1)
+            
+            if user_id in self._entries:
+                old_key = (-self._entries[user_id]["referral_count"], user_id)
+                index = bisect.bisect_left(self._top, old_key)
+                if index < len(self._top) and self._top[index] == old_key:
+                    self._top.pop(index)
+                self._entries.pop(user_id)
+            self._insert_top(user_id, name, referral_count)
+    
+    def top(self, limit: int) -> List[Dict]:
+        """Top referrers, highest first"""
+        with self._lock:
+            return [dict(self._entries[user_id]) for _, user_id in self._top[:limit]]
+    
+    def rank(self, referral_count: int) -> int:
+        """1-based rank for a referral count (ties share a rank)"""
+        with self._lock:
+            if referral_count <= 0:
+                return self._ranked + 1
+            return self._ranked - self._tree_prefix(referral_count) + 1
+
+
+class UserCache:
+    """Bounded LRU of user records, refreshed by every write to the users row"""
+    
+    def __init__(self, max_size: int = USER_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[int, Dict]" = OrderedDict()
+        self._record_bytes = 0
+    
+    @staticmethod
+    def _sizeof(record: Dict) -> int:
+        return sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+    
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Cached record copy, or None on a miss"""
+        with self._lock:
+            record = self._records.get(user_id)
+            if record is None:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            self._records.move_to_end(user_id)
+            return dict(record)
+    
+    def put(self, user_id: int, record: Dict):
+        """Write-through from a committed write"""
+        with self._lock:
+            self.generation += 1
+            self._store(user_id, dict(record))
+    
+    def put_if_fresh(self, user_id: int, record: Dict, generation: int):
+        """Cache a read unless a write landed since `generation` was taken"""
+        with self._lock:
+            if self.generation == generation:
+                self._store(user_id, dict(record))
+    
+    def _store(self, user_id: int, record: Dict):
+        previous = self._records.get(user_id)
+        if previous is not None:
+            self._record_bytes -= self._sizeof(previous)
+        self._records[user_id] = record
+        self._record_bytes += self._sizeof(record)
+        self._records.move_to_end(user_id)
+        while len(self._records) > self.max_size:
+            _, evicted = self._records.popitem(last=False)
+            self._record_bytes -= self._sizeof(evicted)
+            self.evictions += 1
+    
+    def stats(self) -> Dict:
+        """Hit ratio, size and approximate memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            memory = sys.getsizeof(self._records) + self._record_bytes
+            return {
+                "size": len(self._records),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "memory_bytes": memory
+            }
+
+
+class Database:
+    """Premium SQLite Database Handler"""
+    
+    def __init__(self, db_name: str = DATABASE_PATH):
+        self.db_name = db_name
+        self.pool = ConnectionPool(db_name)
+        self.settings = SettingsSnapshot({})
+        self.settings_hits = 0
+        self.settings_loads = 0
+        self.quiz_selector = QuizSelector()
+        self.leaderboard = ReferralLeaderboard()
+        self.user_cache = UserCache()
+        self.stats: Dict[str, float] = {}
+        self._stats_lock = threading.Lock()
+        self.init_database()
+    
     def init_database(self):
         """Initialize all database tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.pool.writer() as cursor:
+            self._create_tables(cursor)
+            self._migrate(cursor)
         
+        self.load_settings()
+        self.load_quiz_ids()
+        self.load_leaderboard()
+        self.load_stats()
+        logger.info("✅ Database initialized successfully!")
+    
+    def _create_tables(self, cursor: sqlite3.Cursor):
+        """Create tables and seed defaults"""
         # Users Table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -211,144 +672,358 @@ class Database:
                 "INSERT OR IGNORE INTO channels (channel_id, channel_name, added_date) VALUES (?, ?, ?)",
                 (ch_id, f"Channel_{ch_id}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             )
+    
+    # ═══════════════════════════════════════════════════════════
+    # SCHEMA MIGRATIONS
+    # ═══════════════════════════════════════════════════════════
+    
+    def _migrate(self, cursor: sqlite3.Cursor):
+        """Apply pending migrations, tracked in PRAGMA user_version"""
+        migrations = [
+            self._migrate_answer_counters,
+            self._migrate_referral_index,
+            self._migrate_stats_counters,
+            self._migrate_quiz_question_index,
+            self._migrate_channel_invite_links,
+            self._migrate_broadcast_jobs,
+            self._migrate_undeliverable_users,
+            self._migrate_persistence
+        ]
         
-        conn.commit()
-        conn.close()
-        logger.info("✅ Database initialized successfully!")
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        
+        for target, migration in enumerate(migrations, start=1):
+            if version < target:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                logger.info(f"✅ Database migrated to schema v{target}")
+    
+    def _migrate_answer_counters(self, cursor: sqlite3.Cursor):
+        """v1: per-user answer/earning counters, backfilled from answer history"""
+        cursor.execute("ALTER TABLE users ADD COLUMN correct_answers INTEGER DEFAULT 0")
+        cursor.execute("ALTER TABLE users ADD COLUMN wrong_answers INTEGER DEFAULT 0")
+        cursor.execute("ALTER TABLE users ADD COLUMN total_earned REAL DEFAULT 0.0")
+        cursor.execute("ALTER TABLE users ADD COLUMN total_spent REAL DEFAULT 0.0")
+        
+        # Earnings were never recorded per answer, so only the answer counts can be backfilled
+        cursor.execute("""
+            UPDATE users SET
+                correct_answers = (SELECT COUNT(*) FROM user_quiz_answered a
+                                   WHERE a.user_id = users.user_id AND a.is_correct = 1),
+                wrong_answers = (SELECT COUNT(*) FROM user_quiz_answered a
+                                 WHERE a.user_id = users.user_id AND a.is_correct = 0)
+        """)
+    
+    def _migrate_referral_index(self, cursor: sqlite3.Cursor):
+        """v2: index referral_count for the leaderboard seed queries"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_referral_count ON users (referral_count)")
+    
+    def _migrate_stats_counters(self, cursor: sqlite3.Cursor):
+        """v3: running totals for the admin dashboard, backfilled once"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats (
+                key TEXT PRIMARY KEY,
+                value REAL NOT NULL DEFAULT 0
+            )
+        """)
+        
+        backfill = {
+            STAT_USERS: "SELECT COUNT(*) FROM users",
+            STAT_BANNED_USERS: "SELECT COUNT(*) FROM users WHERE is_banned = 1",
+            STAT_QUIZZES: "SELECT COUNT(*) FROM quiz",
+            STAT_ANSWERS: "SELECT COUNT(*) FROM user_quiz_answered",
+            STAT_PENDING_WITHDRAWALS: "SELECT COUNT(*) FROM withdraw_requests WHERE status = 'pending'",
+            STAT_PENDING_WITHDRAW_AMOUNT: "SELECT COALESCE(SUM(amount), 0) FROM withdraw_requests WHERE status = 'pending'",
+            STAT_TOTAL_BALANCE: "SELECT COALESCE(SUM(balance), 0) FROM users"
+        }
+        for key, query in backfill.items():
+            cursor.execute(query)
+            cursor.execute(
+                "INSERT OR REPLACE INTO stats (key, value) VALUES (?, ?)",
+                (key, cursor.fetchone()[0])
+            )
+    
+    def _migrate_quiz_question_index(self, cursor: sqlite3.Cursor):
+        """v4: index quiz questions for duplicate detection on import"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_quiz_question ON quiz (question)")
+    
+    def _migrate_channel_invite_links(self, cursor: sqlite3.Cursor):
+        """v5: persisted invite links for the force join screen"""
+        cursor.execute("ALTER TABLE channels ADD COLUMN invite_link TEXT")
+        cursor.execute("ALTER TABLE channels ADD COLUMN invite_link_updated TEXT")
+    
+    def _migrate_broadcast_jobs(self, cursor: sqlite3.Cursor):
+        """v6: broadcasts as resumable jobs with a user_id cursor"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER NOT NULL,
+                message_text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                cursor_user_id INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_date TEXT NOT NULL,
+                updated_date TEXT NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs (status)")
+    
+    def _migrate_undeliverable_users(self, cursor: sqlite3.Cursor):
+        """v7: remember users the bot can no longer message"""
+        cursor.execute("ALTER TABLE users ADD COLUMN undeliverable_reason TEXT")
+        cursor.execute("ALTER TABLE users ADD COLUMN undeliverable_since TEXT")
+        # Broadcast recipients walk this partial index, so undeliverable users cost nothing
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_deliverable ON users (user_id)
+            WHERE is_banned = 0 AND undeliverable_reason IS NULL
+        """)
+        cursor.execute(
+            "INSERT OR REPLACE INTO stats (key, value) VALUES (?, 0)",
+            (STAT_UNDELIVERABLE,)
+        )
+    
+    def _migrate_persistence(self, cursor: sqlite3.Cursor):
+        """v8: user_data and conversation states that survive restarts"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_state (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_date TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_state (
+                name TEXT NOT NULL,
+                conv_key TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated_date TEXT NOT NULL,
+                PRIMARY KEY (name, conv_key)
+            )
+        """)
+    
+    # ═══════════════════════════════════════════════════════════
+    # STATS METHODS
+    # ═══════════════════════════════════════════════════════════
+    
+    def load_stats(self):
+        """Load the stats counters into memory"""
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT key, value FROM stats")
+            with self._stats_lock:
+                self.stats = {row["key"]: row["value"] for row in cursor.fetchall()}
+    
+    def _bump_stats(self, cursor: sqlite3.Cursor, deltas: Dict[str, float]):
+        """Adjust counters inside the caller's transaction; memory follows on commit"""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        for key, delta in deltas.items():
+            cursor.execute("UPDATE stats SET value = value + ? WHERE key = ?", (delta, key))
+        
+        def apply():
+            with self._stats_lock:
+                for key, delta in deltas.items():
+                    self.stats[key] = self.stats.get(key, 0) + delta
+        
+        self.pool.after_commit(apply)
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Dashboard counters (no I/O)"""
+        with self._stats_lock:
+            return dict(self.stats)
     
     # ═══════════════════════════════════════════════════════════
     # USER METHODS
     # ═══════════════════════════════════════════════════════════
     
+    def _refresh_user(self, cursor: sqlite3.Cursor, user_id: int) -> Optional[Dict]:
+        """Re-read a user inside a write; the cache is updated on commit"""
+        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        record = dict(row)
+        self.pool.after_commit(lambda: self.user_cache.put(user_id, record))
+        return record
+    
     def add_user(self, user_id: int, name: str, username: str = None, referred_by: int = None) -> bool:
         """Add new user to database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 """INSERT OR IGNORE INTO users 
                    (user_id, name, username, referred_by, join_date) 
                    VALUES (?, ?, ?, ?, ?)""",
                 (user_id, name, username, referred_by, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             )
+            if cursor.rowcount == 0:
+                return False
             
-            if cursor.rowcount > 0:
-                conn.commit()
-                return True
-            return False
-        finally:
-            conn.close()
+            self._bump_stats(cursor, {STAT_USERS: 1})
+            self._refresh_user(cursor, user_id)
+            return True
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user details"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        record = self.user_cache.get(user_id)
+        if record is not None:
+            return record
+        return self.load_user(user_id)
+    
+    def load_user(self, user_id: int) -> Optional[Dict]:
+        """Read a user row and cache it (the caller already counted the cache miss)"""
+        generation = self.user_cache.generation
+        with self.pool.reader() as cursor:
             cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
             row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+            if not row:
+                return None
+            
+            record = dict(row)
+            self.user_cache.put_if_fresh(user_id, record, generation)
+            return record
     
     def update_balance(self, user_id: int, amount: float) -> bool:
         """Update user balance (add or deduct)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 "UPDATE users SET balance = balance + ? WHERE user_id = ?",
                 (amount, user_id)
             )
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            if cursor.rowcount == 0:
+                return False
+            
+            self._bump_stats(cursor, {STAT_TOTAL_BALANCE: amount})
+            self._refresh_user(cursor, user_id)
+            return True
     
     def set_balance(self, user_id: int, amount: float) -> bool:
         """Set exact balance for user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
+            cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            if not row:
+                return False
+            
             cursor.execute(
                 "UPDATE users SET balance = ? WHERE user_id = ?",
                 (amount, user_id)
             )
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            self._bump_stats(cursor, {STAT_TOTAL_BALANCE: amount - row["balance"]})
+            self._refresh_user(cursor, user_id)
+            return True
     
     def increment_referral(self, user_id: int) -> bool:
         """Increment referral count"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 "UPDATE users SET referral_count = referral_count + 1 WHERE user_id = ?",
                 (user_id,)
             )
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            if cursor.rowcount == 0:
+                return False
+            
+            record = self._refresh_user(cursor, user_id)
+            self.pool.after_commit(
+                lambda: self.leaderboard.on_increment(user_id, record["name"], record["referral_count"])
+            )
+            return True
     
     def increment_quiz_played(self, user_id: int) -> bool:
         """Increment quiz played count"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 "UPDATE users SET quiz_played = quiz_played + 1 WHERE user_id = ?",
                 (user_id,)
             )
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            if cursor.rowcount == 0:
+                return False
+            
+            self._refresh_user(cursor, user_id)
+            return True
     
     def get_all_users(self) -> List[Dict]:
         """Get all users"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.reader() as cursor:
             cursor.execute("SELECT * FROM users WHERE is_banned = 0")
             return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+    
+    def get_user_id_page(self, after_user_id: int, limit: int = BROADCAST_PAGE_SIZE) -> List[int]:
+        """Next page of non-banned user_ids above after_user_id, in user_id order"""
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                """SELECT user_id FROM users
+                   WHERE user_id > ? AND is_banned = 0 AND undeliverable_reason IS NULL
+                   ORDER BY user_id LIMIT ?""",
+                (after_user_id, limit)
+            )
+            return [row[0] for row in cursor.fetchall()]
+    
+    def mark_undeliverable(self, marks: List[Tuple[int, str]]) -> int:
+        """Flag users whose messages fail for good, returns how many were newly flagged"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        marked = 0
+        with self.pool.writer() as cursor:
+            for user_id, reason in marks:
+                cursor.execute(
+                    """UPDATE users SET undeliverable_reason = ?, undeliverable_since = ?
+                       WHERE user_id = ? AND is_banned = 0 AND undeliverable_reason IS NULL""",
+                    (reason, now, user_id)
+                )
+                if cursor.rowcount > 0:
+                    marked += 1
+                    self._refresh_user(cursor, user_id)
+            self._bump_stats(cursor, {STAT_UNDELIVERABLE: marked})
+        return marked
+    
+    def clear_undeliverable(self, user_id: int) -> bool:
+        """The user reached the bot again, so messages work again"""
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                """UPDATE users SET undeliverable_reason = NULL, undeliverable_since = NULL
+                   WHERE user_id = ? AND undeliverable_reason IS NOT NULL""",
+                (user_id,)
+            )
+            if cursor.rowcount == 0:
+                return False
+            
+            self._bump_stats(cursor, {STAT_UNDELIVERABLE: -1})
+            self._refresh_user(cursor, user_id)
+            return True
+    
+    def get_reachable_users_count(self) -> int:
+        """Users a broadcast would reach (from the stats counters)"""
+        stats = self.get_stats()
+        return int(stats.get(STAT_USERS, 0) - stats.get(STAT_BANNED_USERS, 0) - stats.get(STAT_UNDELIVERABLE, 0))
     
     def get_total_users_count(self) -> int:
-        """Get total users count"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("SELECT COUNT(*) FROM users")
-            return cursor.fetchone()[0]
-        finally:
-            conn.close()
+        """Get total users count (stats counter, no I/O)"""
+        return int(self.get_stats().get(STAT_USERS, 0))
     
-    def get_top_referrers(self, limit: int = 10) -> List[Dict]:
-        """Get top referrers"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+    def load_leaderboard(self):
+        """Seed the in-memory referral leaderboard"""
+        with self.pool.reader() as cursor:
             cursor.execute(
                 """SELECT user_id, name, referral_count FROM users 
                    WHERE referral_count > 0 
-                   ORDER BY referral_count DESC LIMIT ?""",
-                (limit,)
+                   ORDER BY referral_count DESC, user_id LIMIT ?""",
+                (self.leaderboard.size,)
             )
-            return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+            top_rows = [dict(row) for row in cursor.fetchall()]
+            
+            cursor.execute(
+                "SELECT referral_count, COUNT(*) FROM users WHERE referral_count > 0 GROUP BY referral_count"
+            )
+            self.leaderboard.load(top_rows, [(row[0], row[1]) for row in cursor.fetchall()])
+    
+    def get_top_referrers(self, limit: int = 10) -> List[Dict]:
+        """Get top referrers (in-memory leaderboard, no I/O)"""
+        return self.leaderboard.top(limit)
+    
+    def get_referral_rank(self, referral_count: int) -> int:
+        """Get leaderboard position for a referral count (no I/O)"""
+        return self.leaderboard.rank(referral_count)
     
     # ═══════════════════════════════════════════════════════════
     # CHANNEL METHODS
@@ -356,41 +1031,44 @@ class Database:
     
     def get_channels(self) -> List[Dict]:
         """Get all force channels"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.reader() as cursor:
             cursor.execute("SELECT * FROM channels")
             return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
     
     def add_channel(self, channel_id: int, channel_name: str = None) -> bool:
         """Add new channel"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 "INSERT OR IGNORE INTO channels (channel_id, channel_name, added_date) VALUES (?, ?, ?)",
                 (channel_id, channel_name or f"Channel_{channel_id}", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             )
-            conn.commit()
             return cursor.rowcount > 0
-        finally:
-            conn.close()
     
     def remove_channel(self, channel_id: int) -> bool:
         """Remove channel"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute("DELETE FROM channels WHERE channel_id = ?", (channel_id,))
-            conn.commit()
             return cursor.rowcount > 0
-        finally:
-            conn.close()
+    
+    def get_stale_invite_links(self, max_age: float) -> List[Dict]:
+        """Channels whose invite link is missing or older than max_age seconds"""
+        cutoff = datetime.fromtimestamp(time.time() - max_age).strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.reader() as cursor:
+            cursor.execute(
+                """SELECT channel_id, invite_link FROM channels
+                   WHERE invite_link IS NULL OR invite_link_updated < ?""",
+                (cutoff,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def set_channel_invite_link(self, channel_id: int, invite_link: str) -> bool:
+        """Store a channel invite link"""
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                "UPDATE channels SET invite_link = ?, invite_link_updated = ? WHERE channel_id = ?",
+                (invite_link, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), channel_id)
+            )
+            return cursor.rowcount > 0
     
     # ═══════════════════════════════════════════════════════════
     # QUIZ METHODS
@@ -398,10 +1076,7 @@ class Database:
     
     def add_quiz(self, question: str, options: List[str], correct: int) -> int:
         """Add new quiz"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 """INSERT INTO quiz 
                    (question, option1, option2, option3, option4, correct_option, added_date) 
@@ -409,95 +1084,185 @@ class Database:
                 (question, options[0], options[1], options[2], options[3], correct, 
                  datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             )
-            conn.commit()
-            return cursor.lastrowid
-        finally:
-            conn.close()
+            quiz_id = cursor.lastrowid
+            self._bump_stats(cursor, {STAT_QUIZZES: 1})
+        
+        self.quiz_selector.add_quiz(quiz_id)
+        return quiz_id
+    
+    def add_quizzes(self, quizzes: List[Tuple[str, List[str], int]]) -> Dict[str, int]:
+        """Bulk add quizzes in one transaction, skipping invalid and duplicate questions"""
+        result = {"inserted": 0, "rejected": 0, "duplicate": 0}
+        valid = []
+        
+        for question, options, correct in quizzes:
+            question = (question or "").strip()
+            options = [option.strip() for option in options]
+            if not question or len(options) != 4 or not all(options) or not 1 <= correct <= 4:
+                result["rejected"] += 1
+            else:
+                valid.append((question, options, correct))
+        
+        if not valid:
+            return result
+        
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.writer() as cursor:
+            questions = list({question for question, _, _ in valid})
+            existing = set()
+            for start in range(0, len(questions), 500):
+                chunk = questions[start:start + 500]
+                cursor.execute(
+                    f"SELECT question FROM quiz WHERE question IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+            
+            rows = []
+            for question, options, correct in valid:
+                if question in existing:
+                    result["duplicate"] += 1
+                    continue
+                existing.add(question)
+                rows.append((question, options[0], options[1], options[2], options[3], correct, now))
+            
+            if not rows:
+                return result
+            
+            cursor.executemany(
+                """INSERT INTO quiz 
+                   (question, option1, option2, option3, option4, correct_option, added_date) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+            # Single writer + AUTOINCREMENT: the batch got consecutive ids
+            cursor.execute("SELECT MAX(quiz_id) FROM quiz")
+            last_id = cursor.fetchone()[0]
+            quiz_ids = range(last_id - len(rows) + 1, last_id + 1)
+            
+            self._bump_stats(cursor, {STAT_QUIZZES: len(rows)})
+            self.pool.after_commit(lambda: self.quiz_selector.add_quizzes(quiz_ids))
+            result["inserted"] = len(rows)
+        
+        return result
+    
+    def load_quiz_ids(self):
+        """Load every quiz id into the quiz selector"""
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT quiz_id FROM quiz")
+            self.quiz_selector.load_quizzes(row[0] for row in cursor)
     
     def get_quiz(self, quiz_id: int) -> Optional[Dict]:
         """Get quiz by ID"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.reader() as cursor:
             cursor.execute("SELECT * FROM quiz WHERE quiz_id = ?", (quiz_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
-        finally:
-            conn.close()
     
     def get_unanswered_quiz(self, user_id: int) -> Optional[Dict]:
         """Get random unanswered quiz for user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.reader() as cursor:
+            if not self.quiz_selector.has_user(user_id):
+                cursor.execute("SELECT quiz_id FROM user_quiz_answered WHERE user_id = ?", (user_id,))
+                self.quiz_selector.load_user(user_id, [row[0] for row in cursor.fetchall()])
+            
+            # Re-check the pick against the table: answers may land between loading and picking
+            for _ in range(3):
+                quiz_id = self.quiz_selector.pick(user_id)
+                if quiz_id is None:
+                    return None
+                
+                cursor.execute(
+                    """SELECT quiz.*, EXISTS(
+                           SELECT 1 FROM user_quiz_answered WHERE user_id = ? AND quiz_id = quiz.quiz_id
+                       ) AS answered 
+                       FROM quiz WHERE quiz_id = ?""",
+                    (user_id, quiz_id)
+                )
+                row = cursor.fetchone()
+                if row and not row["answered"]:
+                    quiz = dict(row)
+                    quiz.pop("answered")
+                    return quiz
+                
+                self.quiz_selector.mark_answered(user_id, quiz_id)
+            return None
+    
+    def settle_quiz_answer(self, user_id: int, quiz_id: int, answer: int,
+                           cost: float, reward: float) -> Dict:
+        """Settle a quiz answer (answered row, cost/reward, counter) in one transaction"""
+        with self.pool.writer() as cursor:
+            cursor.execute("SELECT * FROM quiz WHERE quiz_id = ?", (quiz_id,))
+            row = cursor.fetchone()
+            if not row:
+                return {"status": QUIZ_NOT_FOUND}
+            
+            quiz = dict(row)
+            is_correct = (answer == quiz["correct_option"])
+            
             cursor.execute(
-                """SELECT * FROM quiz WHERE quiz_id NOT IN 
-                   (SELECT quiz_id FROM user_quiz_answered WHERE user_id = ?) 
-                   ORDER BY RANDOM() LIMIT 1""",
-                (user_id,)
+                """INSERT OR IGNORE INTO user_quiz_answered 
+                   (user_id, quiz_id, answered_date, is_correct) 
+                   VALUES (?, ?, ?, ?)""",
+                (user_id, quiz_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 1 if is_correct else 0)
             )
-            row = cursor.fetchone()
-            return dict(row) if row else None
-        finally:
-            conn.close()
+            if cursor.rowcount == 0:
+                return {"status": QUIZ_ALREADY_ANSWERED, "quiz": quiz}
+            
+            self.pool.after_commit(lambda: self.quiz_selector.mark_answered(user_id, quiz_id))
+            earned = reward if is_correct else 0.0
+            self._bump_stats(cursor, {STAT_ANSWERS: 1, STAT_TOTAL_BALANCE: earned - cost})
+            cursor.execute(
+                """UPDATE users SET balance = balance + ?, quiz_played = quiz_played + 1, 
+                       correct_answers = correct_answers + ?, wrong_answers = wrong_answers + ?, 
+                       total_earned = total_earned + ?, total_spent = total_spent + ? 
+                   WHERE user_id = ?""",
+                (earned - cost, 1 if is_correct else 0, 0 if is_correct else 1, earned, cost, user_id)
+            )
+            self._refresh_user(cursor, user_id)
+            return {"status": QUIZ_SETTLED, "quiz": quiz, "is_correct": is_correct}
     
     def get_total_quiz_count(self) -> int:
-        """Get total quiz count"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("SELECT COUNT(*) FROM quiz")
-            return cursor.fetchone()[0]
-        finally:
-            conn.close()
+        """Get total quiz count (stats counter, no I/O)"""
+        return int(self.get_stats().get(STAT_QUIZZES, 0))
     
     def answer_quiz(self, user_id: int, quiz_id: int, is_correct: bool) -> bool:
         """Mark quiz as answered by user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 """INSERT OR IGNORE INTO user_quiz_answered 
                    (user_id, quiz_id, answered_date, is_correct) 
                    VALUES (?, ?, ?, ?)""",
                 (user_id, quiz_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 1 if is_correct else 0)
             )
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            if cursor.rowcount == 0:
+                return False
+            
+            cursor.execute(
+                """UPDATE users SET correct_answers = correct_answers + ?, wrong_answers = wrong_answers + ? 
+                   WHERE user_id = ?""",
+                (1 if is_correct else 0, 0 if is_correct else 1, user_id)
+            )
+            self._bump_stats(cursor, {STAT_ANSWERS: 1})
+            self._refresh_user(cursor, user_id)
+            self.pool.after_commit(lambda: self.quiz_selector.mark_answered(user_id, quiz_id))
+            return True
     
     def has_answered_quiz(self, user_id: int, quiz_id: int) -> bool:
         """Check if user has answered quiz"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.reader() as cursor:
             cursor.execute(
                 "SELECT 1 FROM user_quiz_answered WHERE user_id = ? AND quiz_id = ?",
                 (user_id, quiz_id)
             )
             return cursor.fetchone() is not None
-        finally:
-            conn.close()
     
     def get_user_correct_answers(self, user_id: int) -> int:
         """Get count of correct answers by user"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(
-                "SELECT COUNT(*) FROM user_quiz_answered WHERE user_id = ? AND is_correct = 1",
-                (user_id,)
-            )
-            return cursor.fetchone()[0]
-        finally:
-            conn.close()
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT correct_answers FROM users WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
     
     # ═══════════════════════════════════════════════════════════
     # WITHDRAW METHODS
@@ -505,80 +1270,81 @@ class Database:
     
     def create_withdraw_request(self, user_id: int, amount: float, method: str, number: str) -> int:
         """Create withdraw request"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 """INSERT INTO withdraw_requests 
                    (user_id, amount, method, number, request_date) 
                    VALUES (?, ?, ?, ?, ?)""",
                 (user_id, amount, method, number, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             )
-            conn.commit()
-            return cursor.lastrowid
-        finally:
-            conn.close()
+            request_id = cursor.lastrowid
+            self._bump_stats(cursor, {STAT_PENDING_WITHDRAWALS: 1, STAT_PENDING_WITHDRAW_AMOUNT: amount})
+            return request_id
     
     def get_withdraw_requests(self, status: str = "pending") -> List[Dict]:
         """Get withdraw requests by status"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.reader() as cursor:
             cursor.execute(
                 "SELECT * FROM withdraw_requests WHERE status = ? ORDER BY id DESC",
                 (status,)
             )
             return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
     
     def update_withdraw_status(self, request_id: int, status: str) -> bool:
         """Update withdraw request status"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
+            cursor.execute("SELECT status, amount FROM withdraw_requests WHERE id = ?", (request_id,))
+            row = cursor.fetchone()
+            if not row:
+                return False
+            
             cursor.execute(
                 "UPDATE withdraw_requests SET status = ?, processed_date = ? WHERE id = ?",
                 (status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), request_id)
             )
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+            
+            was_pending = row["status"] == "pending"
+            is_pending = status == "pending"
+            if was_pending != is_pending:
+                sign = -1 if was_pending else 1
+                self._bump_stats(cursor, {
+                    STAT_PENDING_WITHDRAWALS: sign,
+                    STAT_PENDING_WITHDRAW_AMOUNT: sign * row["amount"]
+                })
+            return True
     
     # ═══════════════════════════════════════════════════════════
     # SETTINGS METHODS
     # ═══════════════════════════════════════════════════════════
     
-    def get_setting(self, key: str) -> str:
-        """Get setting value"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def load_settings(self) -> SettingsSnapshot:
+        """Load the settings table into a fresh snapshot"""
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT key, value FROM settings")
+            self.settings = SettingsSnapshot({row["key"]: row["value"] for row in cursor.fetchall()})
         
-        try:
-            cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-            row = cursor.fetchone()
-            return row[0] if row else str(DEFAULT_SETTINGS.get(key, "0"))
-        finally:
-            conn.close()
+        self.settings_loads += 1
+        return self.settings
+    
+    def get_setting(self, key: str) -> str:
+        """Get setting value from the in-memory snapshot (no I/O)"""
+        self.settings_hits += 1
+        return self.settings.get(key)
     
     def update_setting(self, key: str, value: str) -> bool:
-        """Update setting value"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        """Update setting value and swap in a new snapshot"""
+        with self.pool.writer() as cursor:
             cursor.execute(
                 "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
                 (key, str(value))
             )
-            conn.commit()
+            
+            def apply():
+                # after_commit runs under the write lock, so concurrent updates cannot lose a key
+                self.settings = self.settings.replace(key, value)
+            
+            self.pool.after_commit(apply)
             return True
-        finally:
-            conn.close()
     
     # ═══════════════════════════════════════════════════════════
     # BROADCAST METHODS
@@ -586,67 +1352,441 @@ class Database:
     
     def log_broadcast(self, admin_id: int, message_text: str, sent_count: int) -> bool:
         """Log broadcast"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.pool.writer() as cursor:
             cursor.execute(
                 "INSERT INTO broadcast_log (admin_id, message_text, sent_count, sent_date) VALUES (?, ?, ?, ?)",
                 (admin_id, message_text, sent_count, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
             )
-            conn.commit()
             return True
-        finally:
-            conn.close()
+    
+    # ═══════════════════════════════════════════════════════════
+    # BROADCAST JOB METHODS
+    # ═══════════════════════════════════════════════════════════
+    
+    def create_broadcast_job(self, admin_id: int, message_text: str, total: int) -> int:
+        """Create a running broadcast job"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                """INSERT INTO broadcast_jobs (admin_id, message_text, status, total, created_date, updated_date)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (admin_id, message_text, BROADCAST_RUNNING, total, now, now)
+            )
+            return cursor.lastrowid
+    
+    def get_broadcast_job(self, job_id: int) -> Optional[Dict]:
+        """Get broadcast job by ID"""
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT * FROM broadcast_jobs WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def get_broadcast_jobs(self, status: str = None, limit: int = 10) -> List[Dict]:
+        """Latest broadcast jobs, optionally only one status"""
+        with self.pool.reader() as cursor:
+            if status:
+                cursor.execute(
+                    "SELECT * FROM broadcast_jobs WHERE status = ? ORDER BY job_id DESC LIMIT ?",
+                    (status, limit)
+                )
+            else:
+                cursor.execute("SELECT * FROM broadcast_jobs ORDER BY job_id DESC LIMIT ?", (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def checkpoint_broadcast_job(self, job_id: int, cursor_user_id: int, sent: int, failed: int) -> bool:
+        """Persist how far a broadcast job has got"""
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                """UPDATE broadcast_jobs SET cursor_user_id = ?, sent = ?, failed = ?, updated_date = ?
+                   WHERE job_id = ?""",
+                (cursor_user_id, sent, failed, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id)
+            )
+            return cursor.rowcount > 0
+    
+    def set_broadcast_job_status(self, job_id: int, status: str, from_statuses: Tuple[str, ...]) -> bool:
+        """Move a job to status, only if it is currently in one of from_statuses"""
+        placeholders = ",".join("?" * len(from_statuses))
+        with self.pool.writer() as cursor:
+            cursor.execute(
+                f"""UPDATE broadcast_jobs SET status = ?, updated_date = ?
+                    WHERE job_id = ? AND status IN ({placeholders})""",
+                (status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), job_id, *from_statuses)
+            )
+            return cursor.rowcount > 0
+    
+    def pause_running_broadcast_jobs(self) -> List[Dict]:
+        """Park every job still marked running as paused; at startup those are jobs a crash interrupted"""
+        with self.pool.writer() as cursor:
+            cursor.execute("SELECT * FROM broadcast_jobs WHERE status = ? ORDER BY job_id", (BROADCAST_RUNNING,))
+            jobs = [dict(row, status=BROADCAST_PAUSED) for row in cursor.fetchall()]
+            cursor.execute(
+                "UPDATE broadcast_jobs SET status = ?, updated_date = ? WHERE status = ?",
+                (BROADCAST_PAUSED, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), BROADCAST_RUNNING)
+            )
+            return jobs
+    
+    # ═══════════════════════════════════════════════════════════
+    # PERSISTENCE METHODS
+    # ═══════════════════════════════════════════════════════════
+    
+    def get_user_state(self, user_id: int) -> Optional[Dict]:
+        """Stored user_data of one user"""
+        with self.pool.reader() as cursor:
+            cursor.execute("SELECT data FROM user_state WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row else None
+    
+    def get_conversation_states(self, name: str, max_age: float = CONVERSATION_MAX_AGE) -> Dict[Tuple, object]:
+        """Open conversations of one ConversationHandler; ones idle for max_age seconds are deleted"""
+        cutoff = datetime.fromtimestamp(time.time() - max_age).strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.writer() as cursor:
+            cursor.execute("DELETE FROM conversation_state WHERE name = ? AND updated_date < ?", (name, cutoff))
+            if cursor.rowcount:
+                logger.info(f"💾 Dropped {cursor.rowcount} stale '{name}' conversations")
+            cursor.execute("SELECT conv_key, state FROM conversation_state WHERE name = ?", (name,))
+            return {tuple(json.loads(row[0])): json.loads(row[1]) for row in cursor.fetchall()}
+    
+    def save_state(self, users: Dict[int, Dict], dropped_users: Iterable[int],
+                   conversations: Dict[Tuple[str, Tuple], object]):
+        """Write a batch of user_data and conversation changes in one transaction"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Empty user_data is the default, so it is deleted rather than stored
+        dropped = [(user_id,) for user_id in dropped_users]
+        dropped += [(user_id,) for user_id, data in users.items() if not data]
+        ended = [(name, json.dumps(list(key))) for (name, key), state in conversations.items() if state is None]
+        
+        with self.pool.writer() as cursor:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO user_state (user_id, data, updated_date) VALUES (?, ?, ?)",
+                [(user_id, json.dumps(data), now) for user_id, data in users.items() if data]
+            )
+            cursor.executemany("DELETE FROM user_state WHERE user_id = ?", dropped)
+            cursor.executemany(
+                "INSERT OR REPLACE INTO conversation_state (name, conv_key, state, updated_date) VALUES (?, ?, ?, ?)",
+                [
+                    (name, json.dumps(list(key)), json.dumps(state), now)
+                    for (name, key), state in conversations.items() if state is not None
+                ]
+            )
+            cursor.executemany("DELETE FROM conversation_state WHERE name = ? AND conv_key = ?", ended)
+
+
+# ═══════════════════════════════════════════════════════════════
+# ⚡ ASYNC DATABASE LAYER
+# ═══════════════════════════════════════════════════════════════
+
+class QueueMetrics:
+    """Queue wait / run time statistics for the async database layer"""
+    
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.waited = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.recent_waits = deque(maxlen=window)
+    
+    def record(self, wait: float, run: float):
+        """Record one finished call (seconds)"""
+        self.calls += 1
+        self.total_wait += wait
+        self.total_run += run
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+    
+    def snapshot(self, depth: int) -> Dict:
+        """Current metrics in milliseconds"""
+        recent = sorted(self.recent_waits)
+        p95 = recent[int(len(recent) * 0.95)] if recent else 0.0
+        return {
+            "calls": self.calls,
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "waited_for_slot": self.waited,
+            "avg_wait_ms": (self.total_wait / self.calls * 1000) if self.calls else 0.0,
+            "p95_wait_ms": p95 * 1000,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_run_ms": (self.total_run / self.calls * 1000) if self.calls else 0.0
+        }
+
+
+class AsyncDatabase:
+    """Awaitable Database facade running SQLite work on a dedicated executor"""
+    
+    def __init__(self, database: Database, workers: int = DB_EXECUTOR_WORKERS,
+                 max_pending: int = DB_MAX_PENDING):
+        self.database = database
+        self.max_pending = max_pending
+        self.depth = 0
+        self.metrics = QueueMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self._slots = asyncio.Semaphore(max_pending)
+    
+    def __getattr__(self, name: str):
+        """Expose every Database method as a coroutine"""
+        attr = getattr(self.database, name)
+        if not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+        
+        call.__name__ = name
+        return call
+    
+    async def run(self, func, *args, **kwargs):
+        """Run func on the executor, waiting (not blocking) when the queue is full"""
+        if self._slots.locked():
+            self.metrics.waited += 1
+        
+        async with self._slots:
+            self.depth += 1
+            self.metrics.max_depth = max(self.metrics.max_depth, self.depth)
+            submitted = time.perf_counter()
+            started = []
+            
+            def job():
+                started.append(time.perf_counter())
+                return func(*args, **kwargs)
+            
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+            finally:
+                self.depth -= 1
+                if started:
+                    finished = time.perf_counter()
+                    self.metrics.record(started[0] - submitted, finished - started[0])
+    
+    def get_setting(self, key: str) -> str:
+        """Settings come from the in-memory snapshot, no executor hop needed"""
+        return self.database.get_setting(key)
+    
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        """Serve cached users on the loop, go to the executor only on a miss"""
+        record = self.database.user_cache.get(user_id)
+        if record is not None:
+            return record
+        return await self.run(self.database.load_user, user_id)
+    
+    def get_top_referrers(self, limit: int = 10) -> List[Dict]:
+        """Leaderboard lives in memory, no executor hop needed"""
+        return self.database.get_top_referrers(limit)
+    
+    def get_referral_rank(self, referral_count: int) -> int:
+        """Leaderboard lives in memory, no executor hop needed"""
+        return self.database.get_referral_rank(referral_count)
+    
+    def get_stats(self) -> Dict[str, float]:
+        """Dashboard counters live in memory, no executor hop needed"""
+        return self.database.get_stats()
+    
+    def get_reachable_users_count(self) -> int:
+        """Derived from the in-memory counters as well"""
+        return self.database.get_reachable_users_count()
+    
+    def stats(self) -> Dict:
+        """Queue depth and wait metrics"""
+        return self.metrics.snapshot(self.depth)
+    
+    def close(self):
+        """Drain the executor and close the connection pool"""
+        self._executor.shutdown(wait=True)
+        self.database.pool.close()
 
 
 # Initialize Database
-db = Database()
+database = Database(DATABASE_PATH)
+db = AsyncDatabase(database)
 
 
 # ═══════════════════════════════════════════════════════════════
 # 🛠️ HELPER FUNCTIONS
 # ═══════════════════════════════════════════════════════════════
 
-async def check_channel_membership(bot, user_id: int, channel_id: int) -> bool:
+class MembershipCache:
+    """TTL cache of channel membership keyed by (user_id, channel_id)"""
+    
+    def __init__(self, positive_ttl: float = MEMBERSHIP_POSITIVE_TTL,
+                 negative_ttl: float = MEMBERSHIP_NEGATIVE_TTL,
+                 max_size: int = MEMBERSHIP_CACHE_SIZE):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[bool, float]]" = OrderedDict()
+    
+    def get(self, user_id: int, channel_id: int) -> Optional[bool]:
+        """Cached membership, or None when unknown / expired"""
+        key = (user_id, channel_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def set(self, user_id: int, channel_id: int, is_member: bool):
+        """Remember a membership answer from the Bot API"""
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        key = (user_id, channel_id)
+        self._entries[key] = (is_member, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def invalidate_channel(self, channel_id: int):
+        """Forget every answer for a channel"""
+        for key in [key for key in self._entries if key[1] == channel_id]:
+            del self._entries[key]
+
+
+membership_cache = MembershipCache()
+
+
+async def check_channel_membership(bot, user_id: int, channel_id: int,
+                                   use_negative_cache: bool = True) -> bool:
     """Check if user is member of a channel"""
+    cached = membership_cache.get(user_id, channel_id)
+    if cached is True or (cached is False and use_negative_cache):
+        return cached
+    
     try:
         member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
-        return member.status in [
-            ChatMemberStatus.MEMBER,
-            ChatMemberStatus.ADMINISTRATOR,
-            ChatMemberStatus.OWNER
-        ]
     except Exception as e:
+        # Errors are not cached, the next check asks again
         logger.error(f"Error checking membership for channel {channel_id}: {e}")
         return False
-
-
-async def check_all_channels_membership(bot, user_id: int) -> Tuple[bool, List[int]]:
-    """Check membership for all force channels"""
-    channels = db.get_channels()
-    not_joined = []
     
-    for channel in channels:
-        is_member = await check_channel_membership(bot, user_id, channel["channel_id"])
-        if not is_member:
-            not_joined.append(channel["channel_id"])
+    is_member = member.status in [
+        ChatMemberStatus.MEMBER,
+        ChatMemberStatus.ADMINISTRATOR,
+        ChatMemberStatus.OWNER
+    ]
+    membership_cache.set(user_id, channel_id, is_member)
+    return is_member
+
+
+async def check_all_channels_membership(bot, user_id: int,
+                                        use_negative_cache: bool = True) -> Tuple[bool, List[int]]:
+    """Check membership for all force channels concurrently"""
+    channels = await db.get_channels()
+    slots = asyncio.Semaphore(MEMBERSHIP_CHECK_CONCURRENCY)
+    
+    async def check(channel_id: int) -> bool:
+        async with slots:
+            try:
+                return await asyncio.wait_for(
+                    check_channel_membership(bot, user_id, channel_id, use_negative_cache),
+                    timeout=MEMBERSHIP_CHECK_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                # A slow channel counts as not joined this time; nothing is cached
+                logger.warning(f"Membership check timed out for channel {channel_id}")
+                return False
+    
+    results = await asyncio.gather(*(check(channel["channel_id"]) for channel in channels))
+    not_joined = [
+        channel["channel_id"] for channel, is_member in zip(channels, results) if not is_member
+    ]
     
     return len(not_joined) == 0, not_joined
 
 
-async def get_channel_invite_link(bot, channel_id: int) -> str:
-    """Get channel invite link"""
+def get_channel_invite_link(channel: Dict) -> str:
+    """Stored invite link of a channel row, no Bot API calls"""
+    return channel.get("invite_link") or f"https://t.me/c/{str(channel['channel_id'])[4:]}"
+
+
+async def refresh_channel_invite_link(bot, channel_id: int, current_link: str = None) -> bool:
+    """Fetch a channel's invite link from the Bot API and store it"""
     try:
         chat = await bot.get_chat(channel_id)
-        if chat.invite_link:
-            return chat.invite_link
-        else:
-            link = await bot.create_chat_invite_link(channel_id)
-            return link.invite_link
+        link = chat.invite_link or current_link
+        if not link:
+            # Only mint a new link when the channel has none at all
+            link = (await bot.create_chat_invite_link(channel_id)).invite_link
     except Exception as e:
         logger.error(f"Error getting invite link for channel {channel_id}: {e}")
-        return f"https://t.me/c/{str(channel_id)[4:]}"
+        return False
+    
+    return await db.set_channel_invite_link(channel_id, link)
+
+
+async def refresh_invite_links(bot, max_age: float = INVITE_LINK_REFRESH_INTERVAL) -> int:
+    """Refresh every missing or stale invite link, returns how many were stored"""
+    refreshed = 0
+    for channel in await db.get_stale_invite_links(max_age):
+        if await refresh_channel_invite_link(bot, channel["channel_id"], channel["invite_link"]):
+            refreshed += 1
+    return refreshed
+
+
+async def invite_link_refresher(bot):
+    """Background task keeping the stored invite links fresh"""
+    while True:
+        try:
+            refreshed = await refresh_invite_links(bot)
+            if refreshed:
+                logger.info(f"🔗 Refreshed {refreshed} channel invite link(s)")
+        except Exception as e:
+            logger.error(f"Invite link refresh failed: {e}")
+        await asyncio.sleep(INVITE_LINK_CHECK_INTERVAL)
+
+
+def undeliverable_reason(error: Exception) -> Optional[str]:
+    """Why a send failed for good, or None when it may work next time"""
+    message = str(error).lower()
+    if isinstance(error, Forbidden):
+        if "blocked" in message:
+            return "blocked"
+        if "deactivated" in message:
+            return "deactivated"
+        return "forbidden"
+    if isinstance(error, BadRequest) and "chat not found" in message:
+        return "chat_not_found"
+    return None
+
+
+async def send_to_user(bot, user_id: int, text: str, **kwargs) -> bool:
+    """Message a user unless known undeliverable; permanent failures are recorded"""
+    user = await db.get_user(user_id)
+    if user and user.get("undeliverable_reason"):
+        return False
+    
+    try:
+        await bot.send_message(chat_id=user_id, text=text, **kwargs)
+        return True
+    except Exception as e:
+        reason = undeliverable_reason(e)
+        if reason:
+            await db.mark_undeliverable([(user_id, reason)])
+        return False
+
+
+class ReferralLinks:
+    """Referral and share URLs prebuilt from the bot identity"""
+    
+    SHARE_TEXT = "Join this awesome Quiz Earn Bot and earn money!"
+    
+    def __init__(self, username: str):
+        self.username = username
+        self._link_prefix = f"https://t.me/{username}?start="
+        self._share_prefix = f"https://t.me/share/url?url={self._link_prefix}"
+        self._share_suffix = f"&text={self.SHARE_TEXT}"
+    
+    def link(self, user_id: int) -> str:
+        """Referral link of a user"""
+        return f"{self._link_prefix}{user_id}"
+    
+    def share_url(self, user_id: int) -> str:
+        """Telegram share URL for a user's referral link"""
+        return f"{self._share_prefix}{user_id}{self._share_suffix}"
 
 
 def is_admin(user_id: int) -> bool:
@@ -654,8 +1794,8 @@ def is_admin(user_id: int) -> bool:
     return user_id == ADMIN_ID
 
 
-def get_main_menu_keyboard(is_admin_user: bool = False) -> InlineKeyboardMarkup:
-    """Get main menu keyboard"""
+def build_main_menu_keyboard(is_admin_user: bool) -> InlineKeyboardMarkup:
+    """Build the main menu keyboard"""
     buttons = [
         [InlineKeyboardButton("🧠 Play Quiz", callback_data="play_quiz")],
         [InlineKeyboardButton("👥 Refer & Earn", callback_data="refer_earn"),
@@ -663,23 +1803,574 @@ def get_main_menu_keyboard(is_admin_user: bool = False) -> InlineKeyboardMarkup:
         [InlineKeyboardButton("👤 Profile", callback_data="profile")]
     ]
     
-    if is_admin_user:
-        buttons.append([InlineKeyboardButton("⚙️ Admin Panel", callback_data="admin_panel")])
+    if is_admin_user:
+        buttons.append([InlineKeyboardButton("⚙️ Admin Panel", callback_data="admin_panel")])
+    
+    return InlineKeyboardMarkup(buttons)
+
+
+BACK_TO_MENU_BUTTON = InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")
+SKIP_QUIZ_BUTTON = InlineKeyboardButton("❌ Skip Quiz", callback_data="skip_quiz")
+
+# Telegram objects are frozen after __init__, so one instance can be sent to every chat
+STATIC_KEYBOARDS = MappingProxyType({
+    "main_menu": build_main_menu_keyboard(False),
+    "main_menu_admin": build_main_menu_keyboard(True),
+    "back_menu": InlineKeyboardMarkup([[BACK_TO_MENU_BUTTON]]),
+    "quiz_result": InlineKeyboardMarkup([
+        [InlineKeyboardButton("🧠 Play Again", callback_data="play_quiz")],
+        [BACK_TO_MENU_BUTTON]
+    ]),
+    "quiz_skipped": InlineKeyboardMarkup([
+        [InlineKeyboardButton("🧠 Play Another Quiz", callback_data="play_quiz")],
+        [BACK_TO_MENU_BUTTON]
+    ]),
+    "withdraw_methods": InlineKeyboardMarkup([
+        [InlineKeyboardButton("📱 bKash", callback_data="withdraw_bkash")],
+        [InlineKeyboardButton("📱 Nagad", callback_data="withdraw_nagad")],
+        [BACK_TO_MENU_BUTTON]
+    ])
+})
+
+
+def get_main_menu_keyboard(is_admin_user: bool = False) -> InlineKeyboardMarkup:
+    """Get main menu keyboard"""
+    return STATIC_KEYBOARDS["main_menu_admin" if is_admin_user else "main_menu"]
+
+
+def build_quiz_keyboard(options: Tuple[str, str, str, str]) -> InlineKeyboardMarkup:
+    """Build the answer keyboard of a quiz"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"1️⃣ {options[0]}", callback_data="quiz_ans_1")],
+        [InlineKeyboardButton(f"2️⃣ {options[1]}", callback_data="quiz_ans_2")],
+        [InlineKeyboardButton(f"3️⃣ {options[2]}", callback_data="quiz_ans_3")],
+        [InlineKeyboardButton(f"4️⃣ {options[3]}", callback_data="quiz_ans_4")],
+        [SKIP_QUIZ_BUTTON]
+    ])
+
+
+class QuizKeyboardCache:
+    """LRU of quiz answer keyboards by quiz_id; an entry is rebuilt when the quiz's options change"""
+    
+    # Nothing invalidates entries: the bot only ever adds quizzes and AUTOINCREMENT never reuses an
+    # id, so a cached keyboard stays right. A row edited by hand is caught by the options check in get().
+    
+    def __init__(self, max_size: int = QUIZ_KEYBOARD_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, ...], InlineKeyboardMarkup]]" = OrderedDict()
+    
+    def get(self, quiz: Dict) -> InlineKeyboardMarkup:
+        """Answer keyboard of a quiz row"""
+        quiz_id = quiz["quiz_id"]
+        options = (quiz["option1"], quiz["option2"], quiz["option3"], quiz["option4"])
+        entry = self._entries.get(quiz_id)
+        if entry is not None and entry[0] == options:
+            self.hits += 1
+            self._entries.move_to_end(quiz_id)
+            return entry[1]
+        
+        self.misses += 1
+        keyboard = build_quiz_keyboard(options)
+        self._entries[quiz_id] = (options, keyboard)
+        self._entries.move_to_end(quiz_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return keyboard
+
+
+quiz_keyboards = QuizKeyboardCache()
+
+
+def iter_quiz_blocks(lines: Iterable[str]) -> Iterator[str]:
+    """Yield non-empty `---` separated quiz blocks from a stream of lines"""
+    block = []
+    
+    for line in lines:
+        parts = line.split('---')
+        block.append(parts[0])
+        for part in parts[1:]:
+            text = "".join(block)
+            if text.strip():
+                yield text
+            block = [part]
+    
+    text = "".join(block)
+    if text.strip():
+        yield text
+
+
+def parse_quiz_block(quiz_text: str) -> Optional[Tuple[str, List[str], int]]:
+    """Parse one `---` separated quiz block into (question, options, correct)"""
+    lines = quiz_text.strip().split('\n')
+    
+    if len(lines) < 6:
+        return None
+    
+    try:
+        question = lines[0].strip()
+        options = []
+        correct = 1
+        
+        for line in lines[1:]:
+            line = line.strip()
+            if line.startswith('ANS:'):
+                correct = int(line.split(':')[1].strip())
+            elif '|' in line:
+                parts = line.split('|', 1)
+                if len(parts) == 2:
+                    options.append(parts[1].strip())
+    except Exception as e:
+        logger.error(f"Error parsing quiz: {e}")
+        return None
+    
+    return question, options, correct
+
+
+@lru_cache(maxsize=4096)
+def format_balance(amount: float) -> str:
+    """Format balance with currency, already escaped for MarkdownV2"""
+    text = f"{amount:.2f}৳".replace(".", "\\.")
+    return "\\" + text if text[0] == "-" else text
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as e.g. 1h 05m or 3m 20s"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
+
+
+MARKDOWN_V2_SPECIALS = "\\_*[]()~`>#+-=|{}.!"
+MARKDOWN_V2_ESCAPES = str.maketrans({char: f"\\{char}" for char in MARKDOWN_V2_SPECIALS})
+
+
+@lru_cache(maxsize=4096)
+def escape_markdown(text: str) -> str:
+    """Escape MarkdownV2 special characters in one pass"""
+    return text.translate(MARKDOWN_V2_ESCAPES)
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🎨 MESSAGE TEMPLATES
+# ═══════════════════════════════════════════════════════════════
+
+class MessageTemplate:
+    """MarkdownV2 text with {field} slots; fields are escaped on render, except `raw` ids / counts / balances"""
+    
+    def __init__(self, source: str, raw: Iterable[str] = ()):
+        self.fields: List[str] = []
+        for _, field, spec, conversion in Formatter().parse(source):
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"Template field {field!r} cannot have a format spec or conversion")
+            if not field.isidentifier():
+                raise ValueError(f"Template field must be a plain name: {field!r}")
+            if field not in self.fields:
+                self.fields.append(field)
+        # Parsed once above; a render escapes the text fields and runs one C-level format_map
+        self._escaped = tuple(field for field in self.fields if field not in raw)
+        self._format_map = source.format_map
+    
+    def render(self, **values) -> str:
+        """Fill the slots; a missing field raises KeyError"""
+        for field in self._escaped:
+            values[field] = escape_markdown(values[field])
+        return self._format_map(values)
+
+
+MESSAGE_TEMPLATES = {
+    "main_menu_new": MessageTemplate(
+        "🎊 *স্বাগতম {name}\\!*\n\n"
+        "💎 *Premium Quiz Earn Bot* এ আপনাকে স্বাগত\\!\n"
+        "🧠 Quiz খেলে টাকা আয় করুন\\!\n"
+        "👥 বন্ধুদের Refer করে বোনাস পান\\!\n"
+        "💰 Balance Withdraw করুন সহজেই\\!\n\n"
+        "🔥 *নিচের Menu থেকে যেকোনো Option বেছে নিন\\!*"
+    ),
+    "main_menu": MessageTemplate(
+        "👋 *স্বাগতম আবার, {name}\\!*\n\n"
+        "🔥 *Premium Quiz Earn Bot Main Menu*\n\n"
+        "🧠 Quiz খেলে টাকা আয় করুন\n"
+        "👥 Refer করে Bonus পান\n"
+        "💰 Withdraw করুন সহজেই"
+    ),
+    "back_menu": MessageTemplate(
+        "👋 *স্বাগতম আবার, {name}\\!*\n\n"
+        "🔥 *Premium Quiz Earn Bot Main Menu*\n\n"
+        "💰 Balance: {balance}\n\n"
+        "🧠 Quiz খেলে টাকা আয় করুন\n"
+        "👥 Refer করে Bonus পান\n"
+        "💰 Withdraw করুন সহজেই",
+        raw=("balance",)
+    ),
+    "quiz_card": MessageTemplate(
+        "🧠 *Quiz Time\\!*\n\n"
+        "❓ *Question:*\n{question}\n\n"
+        "💰 Reward: {reward}\n"
+        "💸 Cost: {cost}",
+        raw=("reward", "cost")
+    ),
+    "profile": MessageTemplate(
+        "👤 *Your Profile*\n\n"
+        "🧑 Name: {name}\n"
+        "🆔 User ID: `{user_id}`\n"
+        "💰 Balance: {balance}\n"
+        "👥 Total Referral: {referral_count}\n"
+        "🧠 Quiz Played: {quiz_played}\n"
+        "✅ Correct Answers: {correct_answers}\n"
+        "❌ Wrong Answers: {wrong_answers}\n"
+        "💵 Quiz Earned: {total_earned}\n"
+        "💸 Quiz Spent: {total_spent}\n"
+        "📅 Join Date: {join_date}",
+        raw=("user_id", "balance", "referral_count", "quiz_played", "correct_answers", "wrong_answers",
+             "total_earned", "total_spent")
+    ),
+    "withdraw_confirm": MessageTemplate(
+        "💳 *Withdraw Confirmation*\n\n"
+        "💰 Amount: {amount}\n"
+        "💸 Fee: {fee}\n"
+        "💵 You'll Get: {final_amount}\n"
+        "📱 Method: {method}\n"
+        "📞 Number: `{number}`",
+        raw=("amount", "fee", "final_amount")
+    )
+}
+
+
+def render_message(template: str, /, **fields) -> str:
+    """Render a catalog template"""
+    return MESSAGE_TEMPLATES[template].render(**fields)
+
+
+# ═══════════════════════════════════════════════════════════════
+# 📡 BROADCAST ENGINE
+# ═══════════════════════════════════════════════════════════════
+
+async def iterate_async(items: Iterable) -> AsyncIterator:
+    """Async view of a plain iterable"""
+    for item in items:
+        yield item
+
+
+async def iter_broadcast_recipients(after_user_id: int = 0,
+                                    page_size: int = BROADCAST_PAGE_SIZE) -> AsyncIterator[int]:
+    """Stream user_ids in ascending order, one keyset page in memory at a time"""
+    while True:
+        page = await db.get_user_id_page(after_user_id, page_size)
+        for user_id in page:
+            yield user_id
+        if len(page) < page_size:
+            return
+        after_user_id = page[-1]
+
+
+class TokenBucket:
+    """Async token bucket shared by every sender, with a global pause for RetryAfter"""
+    
+    def __init__(self, rate: float = BROADCAST_RATE, capacity: float = BROADCAST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait for one token; waiters are served in arrival order"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+    
+    def pause(self, seconds: float):
+        """Stop handing out tokens for seconds and drop the saved burst"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+broadcast_limiter = TokenBucket()
+
+
+class BroadcastEngine:
+    """Sends one message to many chats through N senders sharing a token bucket"""
+    
+    def __init__(self, bot, text: str, parse_mode: str = ParseMode.MARKDOWN_V2,
+                 workers: int = BROADCAST_WORKERS, limiter: TokenBucket = None):
+        self.bot = bot
+        self.text = text
+        self.parse_mode = parse_mode
+        self.workers = workers
+        self.limiter = limiter or broadcast_limiter
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.errors: Dict[str, int] = {}
+        self.undeliverable: List[Tuple[int, str]] = []
+        self.started = None
+        self.finished = None
+        self.stopped = False
+        self._pending = set()
+        self._last_queued = 0
+    
+    @property
+    def checkpoint(self) -> int:
+        """Highest chat id below which every chat has been handled (ids are queued ascending)"""
+        return min(self._pending) - 1 if self._pending else self._last_queued
+    
+    def stop(self):
+        """Stop after the sends already in flight; unsent chats stay above the checkpoint"""
+        self.stopped = True
+    
+    @property
+    def done(self) -> int:
+        """Chats handled so far, delivered or not"""
+        return self.sent + self.failed
+    
+    def _error(self, name: str):
+        """Count a failed delivery by error type"""
+        self.errors[name] = self.errors.get(name, 0) + 1
+    
+    async def _send(self, chat_id: int) -> bool:
+        """Deliver to one chat, retrying after RetryAfter with every sender paused"""
+        for _ in range(BROADCAST_MAX_RETRIES + 1):
+            await self.limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=self.text, parse_mode=self.parse_mode)
+                return True
+            except RetryAfter as e:
+                self.retries += 1
+                self.limiter.pause(e.retry_after)
+                logger.warning(f"📡 Flood limit hit, all senders paused for {e.retry_after}s")
+            except Exception as e:
+                self._error(type(e).__name__)
+                reason = undeliverable_reason(e)
+                if reason:
+                    self.undeliverable.append((chat_id, reason))
+                return False
+        
+        self._error(RetryAfter.__name__)
+        return False
+    
+    async def _worker(self, chat_ids: asyncio.Queue):
+        """Sender loop, stops at the None sentinel"""
+        while True:
+            chat_id = await chat_ids.get()
+            if chat_id is None:
+                return
+            if self.stopped:
+                continue
+            
+            if await self._send(chat_id):
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._pending.discard(chat_id)
+    
+    async def run(self, chat_ids: Union[Iterable[int], AsyncIterator[int]]) -> "BroadcastEngine":
+        """Send to every chat id and return the engine with its final counters"""
+        if not hasattr(chat_ids, "__aiter__"):
+            chat_ids = iterate_async(chat_ids)
+        
+        self.started = time.monotonic()
+        pending = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [asyncio.create_task(self._worker(pending)) for _ in range(self.workers)]
+        
+        try:
+            async for chat_id in chat_ids:
+                if self.stopped:
+                    break
+                self._pending.add(chat_id)
+                self._last_queued = chat_id
+                await pending.put(chat_id)
+            for _ in workers:
+                await pending.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.finished = time.monotonic()
+        
+        return self
+    
+    @property
+    def rate(self) -> float:
+        """Messages per second so far"""
+        elapsed = (self.finished or time.monotonic()) - (self.started or time.monotonic())
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+BROADCAST_STATUS_LABELS = {
+    BROADCAST_RUNNING: "🟢 Running",
+    BROADCAST_PAUSED: "⏸ Paused",
+    BROADCAST_CANCELLED: "✖️ Cancelled",
+    BROADCAST_COMPLETED: "✅ Completed"
+}
+
+# job_id -> (job row at start, engine) for jobs sending in this process
+broadcast_runs: Dict[int, Tuple[Dict, BroadcastEngine]] = {}
+broadcast_tasks: Dict[int, asyncio.Task] = {}
+
+
+def broadcast_job_text(job: Dict) -> str:
+    """Progress card of a broadcast job, live counters while it is sending"""
+    sent, failed = job["sent"], job["failed"]
+    run = broadcast_runs.get(job["job_id"])
+    if run:
+        started, engine = run
+        sent, failed = started["sent"] + engine.sent, started["failed"] + engine.failed
+    
+    total = job["total"]
+    percent = min(100, (sent + failed) * 100 // total) if total else 100
+    text = (
+        f"📡 *Broadcast \\#{job['job_id']}*\n"
+        f"{BROADCAST_STATUS_LABELS[job['status']]}\n\n"
+        f"👥 Total Users: {total}\n"
+        f"✅ Sent: {sent}\n"
+        f"❌ Failed: {failed}\n"
+        f"📊 Progress: {percent}%"
+    )
+    
+    if run:
+        remaining = max(0, total - sent - failed)
+        eta = format_duration(remaining / engine.rate) if engine.rate > 0 else "—"
+        text += (
+            f"\n⚡ Speed: {escape_markdown(f'{engine.rate:.1f}')} msg/s\n"
+            f"⏱ ETA: {eta}\n"
+            f"🔁 Flood Retries: {engine.retries}"
+        )
+        if engine.errors:
+            errors = ", ".join(f"{name} {count}" for name, count in sorted(engine.errors.items()))
+            text += f"\n⚠️ Errors: {escape_markdown(errors)}"
     
+    return text
+
+
+def broadcast_job_keyboard(job_id: int, status: str) -> InlineKeyboardMarkup:
+    """Pause / resume / cancel controls for a job"""
+    buttons = []
+    if status == BROADCAST_RUNNING:
+        buttons.append([InlineKeyboardButton("⏸ Pause", callback_data=f"bcast_pause_{job_id}"),
+                        InlineKeyboardButton("✖️ Cancel", callback_data=f"bcast_cancel_{job_id}")])
+    elif status == BROADCAST_PAUSED:
+        buttons.append([InlineKeyboardButton("▶️ Resume", callback_data=f"bcast_resume_{job_id}"),
+                        InlineKeyboardButton("✖️ Cancel", callback_data=f"bcast_cancel_{job_id}")])
+    buttons.append([InlineKeyboardButton("🔄 Refresh", callback_data=f"bcast_view_{job_id}")])
+    buttons.append([InlineKeyboardButton("🔙 Broadcast Jobs", callback_data="admin_broadcast_jobs")])
     return InlineKeyboardMarkup(buttons)
 
 
-def format_balance(amount: float) -> str:
-    """Format balance with currency"""
-    return f"{amount:.2f}৳"
+async def run_broadcast_job(bot, job: Dict, status_message=None):
+    """Send a job from its cursor onwards, checkpointing as it goes"""
+    job_id = job["job_id"]
+    engine = BroadcastEngine(bot, job["message_text"])
+    broadcast_runs[job_id] = (job, engine)
+    finished = asyncio.Event()
+    
+    async def save():
+        marks, engine.undeliverable = engine.undeliverable, []
+        if marks:
+            await db.mark_undeliverable(marks)
+        await db.checkpoint_broadcast_job(
+            job_id,
+            max(job["cursor_user_id"], engine.checkpoint),
+            job["sent"] + engine.sent,
+            job["failed"] + engine.failed
+        )
+    
+    async def report_progress(last_text: Optional[str]) -> Optional[str]:
+        text = broadcast_job_text(job)
+        if text == last_text:
+            return last_text
+        try:
+            await status_message.edit_text(
+                text,
+                parse_mode=ParseMode.MARKDOWN_V2,
+                reply_markup=broadcast_job_keyboard(job_id, BROADCAST_RUNNING)
+            )
+        except Exception as e:
+            logger.warning(f"Broadcast #{job_id} progress update failed: {e}")
+        return text
+    
+    async def housekeeping():
+        # Checkpoints and progress edits run on wall-clock intervals, never per message
+        last_report = time.monotonic()
+        last_text = None
+        while not finished.is_set():
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=BROADCAST_CHECKPOINT_INTERVAL)
+            except asyncio.TimeoutError:
+                await save()
+                if status_message and time.monotonic() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    last_text = await report_progress(last_text)
+    
+    saver = asyncio.create_task(housekeeping())
+    try:
+        await engine.run(iter_broadcast_recipients(job["cursor_user_id"]))
+    finally:
+        finished.set()
+        await saver
+        await save()
+        broadcast_runs.pop(job_id, None)
+    
+    # Paused, cancelled or shutting down: the checkpoint above is where it picks up again
+    if engine.stopped or not await db.set_broadcast_job_status(job_id, BROADCAST_COMPLETED, (BROADCAST_RUNNING,)):
+        return
+    
+    job = await db.get_broadcast_job(job_id)
+    await db.log_broadcast(job["admin_id"], job["message_text"], job["sent"])
+    logger.info(
+        f"📡 Broadcast #{job_id} done: {job['sent']} sent, {job['failed']} failed, "
+        f"{engine.retries} flood retries, {engine.rate:.1f} msg/s, errors {engine.errors}"
+    )
+    
+    try:
+        if status_message:
+            await status_message.edit_text(
+                broadcast_job_text(job),
+                parse_mode=ParseMode.MARKDOWN_V2,
+                reply_markup=broadcast_job_keyboard(job_id, BROADCAST_COMPLETED)
+            )
+        else:
+            await bot.send_message(
+                chat_id=job["admin_id"],
+                text=broadcast_job_text(job),
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+    except Exception as e:
+        logger.error(f"Error reporting broadcast #{job_id}: {e}")
 
 
-def escape_markdown(text: str) -> str:
-    """Escape markdown special characters"""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+def start_broadcast_job(bot, job: Dict, status_message=None) -> asyncio.Task:
+    """Run a broadcast job in the background"""
+    job_id = job["job_id"]
+    
+    def finished(task: asyncio.Task):
+        broadcast_tasks.pop(job_id, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Broadcast #{job_id} crashed: {task.exception()}")
+            # Nothing is sending it any more: leave it resumable from its checkpoint
+            asyncio.create_task(db.set_broadcast_job_status(job_id, BROADCAST_PAUSED, (BROADCAST_RUNNING,)))
+    
+    task = asyncio.create_task(run_broadcast_job(bot, job, status_message))
+    broadcast_tasks[job_id] = task
+    task.add_done_callback(finished)
+    return task
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -707,16 +2398,15 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if not all_joined:
         # Show force join message
-        channels = db.get_channels()
+        channels = await db.get_channels()
         buttons = []
         
         for channel in channels:
             if channel["channel_id"] in not_joined_channels:
-                link = await get_channel_invite_link(context.bot, channel["channel_id"])
                 buttons.append([
                     InlineKeyboardButton(
                         f"📢 Join Channel", 
-                        url=link
+                        url=get_channel_invite_link(channel)
                     )
                 ])
         
@@ -738,7 +2428,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # User has joined all channels
     # Add user to database
-    is_new_user = db.add_user(
+    is_new_user = await db.add_user(
         user_id=user.id,
         name=user.full_name,
         username=user.username,
@@ -748,25 +2438,25 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if is_new_user and referrer_id:
         # Add referral bonus
         ref_bonus = float(db.get_setting("referral_bonus"))
-        db.update_balance(referrer_id, ref_bonus)
-        db.increment_referral(referrer_id)
+        await db.update_balance(referrer_id, ref_bonus)
+        await db.increment_referral(referrer_id)
         
         # Notify referrer
-        try:
-            await context.bot.send_message(
-                chat_id=referrer_id,
-                text=(
-                    f"🎉 *বাহ\\! নতুন রেফারেল পেয়েছেন\\!*\n\n"
-                    f"💰 Bonus: \\+{format_balance(ref_bonus)}\n"
-                    f"👤 New User: {escape_markdown(user.full_name)}"
-                ),
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-        except Exception:
-            pass
+        await send_to_user(
+            context.bot,
+            referrer_id,
+            (
+                f"🎉 *বাহ\\! নতুন রেফারেল পেয়েছেন\\!*\n\n"
+                f"💰 Bonus: \\+{format_balance(ref_bonus)}\n"
+                f"👤 New User: {escape_markdown(user.full_name)}"
+            ),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
     
     # Check if user already exists
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
+    if user_data and user_data.get("undeliverable_reason"):
+        await db.clear_undeliverable(user.id)
     
     if user_data and user_data.get("is_banned"):
         await update.message.reply_text(
@@ -784,23 +2474,7 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, is_
     """Show main menu"""
     user = update.effective_user
     
-    if is_new_user:
-        text = (
-            f"🎊 *স্বাগতম {escape_markdown(user.full_name)}\\!*\n\n"
-            "💎 *Premium Quiz Earn Bot* এ আপনাকে স্বাগত\\!\n"
-            "🧠 Quiz খেলে টাকা আয় করুন\\!\n"
-            "👥 বন্ধুদের Refer করে বোনাস পান\\!\n"
-            "💰 Balance Withdraw করুন সহজেই\\!\n\n"
-            "🔥 *নিচের Menu থেকে যেকোনো Option বেছে নিন\\!*"
-        )
-    else:
-        text = (
-            f"👋 *স্বাগতম আবার, {escape_markdown(user.full_name)}\\!*\n\n"
-            "🔥 *Premium Quiz Earn Bot Main Menu*\n\n"
-            "🧠 Quiz খেলে টাকা আয় করুন\n"
-            "👥 Refer করে Bonus পান\n"
-            "💰 Withdraw করুন সহজেই"
-        )
+    text = render_message("main_menu_new" if is_new_user else "main_menu", name=user.full_name)
     
     await update.message.reply_text(
         text,
@@ -820,8 +2494,10 @@ async def verify_join_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     
     await query.answer("🔍 যাচাই করা হচ্ছে...")
     
-    # Check membership again
-    all_joined, not_joined = await check_all_channels_membership(context.bot, user.id)
+    # Check membership again (the user just joined, so skip cached "not member" answers)
+    all_joined, not_joined = await check_all_channels_membership(
+        context.bot, user.id, use_negative_cache=False
+    )
     
     if not all_joined:
         await query.answer("❌ সব চ্যানেলে Join করেননি!", show_alert=True)
@@ -831,7 +2507,7 @@ async def verify_join_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     referrer_id = context.user_data.get("referrer_id")
     
     # Add user to database
-    is_new_user = db.add_user(
+    is_new_user = await db.add_user(
         user_id=user.id,
         name=user.full_name,
         username=user.username,
@@ -840,23 +2516,23 @@ async def verify_join_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     
     if is_new_user and referrer_id:
         ref_bonus = float(db.get_setting("referral_bonus"))
-        db.update_balance(referrer_id, ref_bonus)
-        db.increment_referral(referrer_id)
+        await db.update_balance(referrer_id, ref_bonus)
+        await db.increment_referral(referrer_id)
         
-        try:
-            await context.bot.send_message(
-                chat_id=referrer_id,
-                text=(
-                    f"🎉 *বাহ\\! নতুন রেফারেল পেয়েছেন\\!*\n\n"
-                    f"💰 Bonus: \\+{format_balance(ref_bonus)}\n"
-                    f"👤 New User: {escape_markdown(user.full_name)}"
-                ),
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-        except Exception:
-            pass
+        await send_to_user(
+            context.bot,
+            referrer_id,
+            (
+                f"🎉 *বাহ\\! নতুন রেফারেল পেয়েছেন\\!*\n\n"
+                f"💰 Bonus: \\+{format_balance(ref_bonus)}\n"
+                f"👤 New User: {escape_markdown(user.full_name)}"
+            ),
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
+    if user_data and user_data.get("undeliverable_reason"):
+        await db.clear_undeliverable(user.id)
     if user_data and user_data.get("is_banned"):
         await query.edit_message_text(
             "🚫 *দুঃখিত\\! আপনাকে এই Bot থেকে Ban করা হয়েছে\\!*",
@@ -895,7 +2571,7 @@ async def play_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     # Get user data
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     if not user_data:
         await query.answer("❌ প্রথমে /start করুন!", show_alert=True)
         return
@@ -909,23 +2585,19 @@ async def play_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"💵 আপনার Balance: {format_balance(user_data['balance'])}\n\n"
             f"👥 Refer করে Balance বাড়ান\\!",
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-            ])
+            reply_markup=STATIC_KEYBOARDS["back_menu"]
         )
         return
     
     # Get unanswered quiz
-    quiz = db.get_unanswered_quiz(user.id)
+    quiz = await db.get_unanswered_quiz(user.id)
     
     if not quiz:
         await query.edit_message_text(
             "😅 *আরে বস\\! এই মুহূর্তে নতুন Quiz নেই\\!*\n\n"
             "⏳ অনুগ্রহ করে পরে আবার চেষ্টা করুন\\!",
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-            ])
+            reply_markup=STATIC_KEYBOARDS["back_menu"]
         )
         return
     
@@ -935,25 +2607,17 @@ async def play_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Show quiz
     quiz_reward = float(db.get_setting("quiz_reward"))
     
-    text = (
-        f"🧠 *Quiz Time\\!*\n\n"
-        f"❓ *Question:*\n{escape_markdown(quiz['question'])}\n\n"
-        f"💰 Reward: {format_balance(quiz_reward)}\n"
-        f"💸 Cost: {format_balance(quiz_cost)}"
+    text = render_message(
+        "quiz_card",
+        question=quiz["question"],
+        reward=format_balance(quiz_reward),
+        cost=format_balance(quiz_cost)
     )
     
-    buttons = [
-        [InlineKeyboardButton(f"1️⃣ {quiz['option1']}", callback_data=f"quiz_ans_1")],
-        [InlineKeyboardButton(f"2️⃣ {quiz['option2']}", callback_data=f"quiz_ans_2")],
-        [InlineKeyboardButton(f"3️⃣ {quiz['option3']}", callback_data=f"quiz_ans_3")],
-        [InlineKeyboardButton(f"4️⃣ {quiz['option4']}", callback_data=f"quiz_ans_4")],
-        [InlineKeyboardButton("❌ Skip Quiz", callback_data="skip_quiz")]
-    ]
-    
     await query.edit_message_text(
         text,
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=quiz_keyboards.get(quiz)
     )
 
 
@@ -970,33 +2634,23 @@ async def quiz_answer_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         await query.answer("❌ Quiz session expired!", show_alert=True)
         return
     
-    # Check if already answered (anti-cheat)
-    if db.has_answered_quiz(user.id, quiz_id):
+    quiz_cost = float(db.get_setting("quiz_cost"))
+    quiz_reward = float(db.get_setting("quiz_reward"))
+    
+    # Settle in one transaction (anti-cheat: a repeated tap finds the answered row)
+    result = await db.settle_quiz_answer(user.id, quiz_id, answer, quiz_cost, quiz_reward)
+    
+    if result["status"] == QUIZ_ALREADY_ANSWERED:
         await query.answer("❌ এই Quiz আগেই উত্তর দিয়েছেন!", show_alert=True)
         return
     
-    # Get quiz data
-    quiz = db.get_quiz(quiz_id)
-    if not quiz:
+    if result["status"] == QUIZ_NOT_FOUND:
         await query.answer("❌ Quiz not found!", show_alert=True)
         return
     
-    # Deduct quiz cost
-    quiz_cost = float(db.get_setting("quiz_cost"))
-    db.update_balance(user.id, -quiz_cost)
-    
-    # Check answer
-    is_correct = (answer == quiz["correct_option"])
+    quiz = result["quiz"]
     
-    if is_correct:
-        # Add reward
-        quiz_reward = float(db.get_setting("quiz_reward"))
-        db.update_balance(user.id, quiz_reward)
-        
-        # Mark as answered
-        db.answer_quiz(user.id, quiz_id, True)
-        db.increment_quiz_played(user.id)
-        
+    if result["is_correct"]:
         text = (
             f"🔥 *বস\\! একদম আগুন Answer\\!*\n\n"
             f"✅ সঠিক উত্তর দিয়েছেন\\!\n"
@@ -1005,10 +2659,6 @@ async def quiz_answer_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             f"💵 Net Profit: \\+{format_balance(quiz_reward - quiz_cost)}"
         )
     else:
-        # Wrong answer
-        db.answer_quiz(user.id, quiz_id, False)
-        db.increment_quiz_played(user.id)
-        
         correct_option_text = quiz[f"option{quiz['correct_option']}"]
         
         text = (
@@ -1018,15 +2668,10 @@ async def quiz_answer_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             f"💪 আবার চেষ্টা করুন\\!"
         )
     
-    buttons = [
-        [InlineKeyboardButton("🧠 Play Again", callback_data="play_quiz")],
-        [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-    ]
-    
     await query.edit_message_text(
         text,
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=STATIC_KEYBOARDS["quiz_result"]
     )
     
     # Clear current quiz
@@ -1043,10 +2688,7 @@ async def skip_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.edit_message_text(
         "⏭️ *Quiz Skip করা হয়েছে\\!*",
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🧠 Play Another Quiz", callback_data="play_quiz")],
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-        ])
+        reply_markup=STATIC_KEYBOARDS["quiz_skipped"]
     )
 
 
@@ -1061,30 +2703,29 @@ async def refer_earn_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     await query.answer()
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     if not user_data:
         await query.answer("❌ প্রথমে /start করুন!", show_alert=True)
         return
     
-    bot_info = await context.bot.get_me()
-    ref_link = f"https://t.me/{bot_info.username}?start={user.id}"
+    referral_links = context.bot_data["referral_links"]
+    ref_link = referral_links.link(user.id)
     
     ref_bonus = float(db.get_setting("referral_bonus"))
-    
-    # Get top referrers
-    top_refs = db.get_top_referrers(10)
+    rank = db.get_referral_rank(user_data["referral_count"])
     
     text = (
         f"👥 *Refer & Earn*\n\n"
         f"🔗 *Your Referral Link:*\n`{ref_link}`\n\n"
         f"💰 Referral Bonus: {format_balance(ref_bonus)} per refer\n"
-        f"📊 Total Referrals: {user_data['referral_count']}\n\n"
+        f"📊 Total Referrals: {user_data['referral_count']}\n"
+        f"🏆 Your Rank: \\#{rank}\n\n"
         f"📱 এই Link Share করে বন্ধুদের Invite করুন\\!\n"
         f"🎁 প্রতিটি Successful Referral এ Bonus পাবেন\\!"
     )
     
     buttons = [
-        [InlineKeyboardButton("📤 Share Link", url=f"https://t.me/share/url?url={ref_link}&text=Join this awesome Quiz Earn Bot and earn money!")],
+        [InlineKeyboardButton("📤 Share Link", url=referral_links.share_url(user.id))],
         [InlineKeyboardButton("🏆 Leaderboard", callback_data="leaderboard")],
         [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
     ]
@@ -1135,7 +2776,7 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.answer()
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     if not user_data:
         await query.answer("❌ প্রথমে /start করুন!", show_alert=True)
         return STATE_WITHDRAW_METHOD
@@ -1150,9 +2791,7 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"📊 Your Referrals: {user_data['referral_count']}\n\n"
             f"🔥 আরো {min_ref - user_data['referral_count']} জন Refer করুন\\!",
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-            ])
+            reply_markup=STATIC_KEYBOARDS["back_menu"]
         )
         return ConversationHandler.END
     
@@ -1166,9 +2805,7 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"💵 Your Balance: {format_balance(user_data['balance'])}\n\n"
             f"🧠 Quiz খেলে বা Refer করে Balance বাড়ান\\!",
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-            ])
+            reply_markup=STATIC_KEYBOARDS["back_menu"]
         )
         return ConversationHandler.END
     
@@ -1180,16 +2817,10 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📱 *Payment Method সিলেক্ট করুন:*"
     )
     
-    buttons = [
-        [InlineKeyboardButton("📱 bKash", callback_data="withdraw_bkash")],
-        [InlineKeyboardButton("📱 Nagad", callback_data="withdraw_nagad")],
-        [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-    ]
-    
     await query.edit_message_text(
         text,
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=STATIC_KEYBOARDS["withdraw_methods"]
     )
     
     return STATE_WITHDRAW_METHOD
@@ -1231,7 +2862,7 @@ async def withdraw_number_handler(update: Update, context: ContextTypes.DEFAULT_
     
     context.user_data["withdraw_number"] = number
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     min_withdraw = float(db.get_setting("min_withdraw"))
     
     await update.message.reply_text(
@@ -1260,7 +2891,7 @@ async def withdraw_amount_handler(update: Update, context: ContextTypes.DEFAULT_
         )
         return STATE_WITHDRAW_AMOUNT
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     min_withdraw = float(db.get_setting("min_withdraw"))
     withdraw_fee = float(db.get_setting("withdraw_fee"))
     
@@ -1290,13 +2921,13 @@ async def withdraw_amount_handler(update: Update, context: ContextTypes.DEFAULT_
     context.user_data["final_amount"] = final_amount
     
     # Show confirmation
-    text = (
-        f"💳 *Withdraw Confirmation*\n\n"
-        f"💰 Amount: {format_balance(amount)}\n"
-        f"💸 Fee: {format_balance(withdraw_fee)}\n"
-        f"💵 You'll Get: {format_balance(final_amount)}\n"
-        f"📱 Method: {context.user_data['withdraw_method']}\n"
-        f"📞 Number: `{context.user_data['withdraw_number']}`"
+    text = render_message(
+        "withdraw_confirm",
+        amount=format_balance(amount),
+        fee=format_balance(withdraw_fee),
+        final_amount=format_balance(final_amount),
+        method=context.user_data["withdraw_method"],
+        number=context.user_data["withdraw_number"]
     )
     
     buttons = [
@@ -1320,7 +2951,7 @@ async def confirm_withdraw_callback(update: Update, context: ContextTypes.DEFAUL
     
     await query.answer()
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     amount = context.user_data["withdraw_amount"]
     final_amount = context.user_data["final_amount"]
     method = context.user_data["withdraw_method"]
@@ -1335,10 +2966,10 @@ async def confirm_withdraw_callback(update: Update, context: ContextTypes.DEFAUL
         return ConversationHandler.END
     
     # Deduct balance
-    db.update_balance(user.id, -amount)
+    await db.update_balance(user.id, -amount)
     
     # Create withdraw request
-    request_id = db.create_withdraw_request(user.id, final_amount, method, number)
+    request_id = await db.create_withdraw_request(user.id, final_amount, method, number)
     
     # Notify admin
     admin_text = (
@@ -1390,9 +3021,7 @@ async def confirm_withdraw_callback(update: Update, context: ContextTypes.DEFAUL
         f"📞 Number: `{number}`\n\n"
         f"⏳ Admin Approval এর জন্য অপেক্ষা করুন\\!",
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-        ])
+        reply_markup=STATIC_KEYBOARDS["back_menu"]
     )
     
     return ConversationHandler.END
@@ -1412,9 +3041,7 @@ async def cancel_withdraw_callback(update: Update, context: ContextTypes.DEFAULT
     await query.edit_message_text(
         "❌ *Withdraw Cancelled\\!*",
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-        ])
+        reply_markup=STATIC_KEYBOARDS["back_menu"]
     )
     
     return ConversationHandler.END
@@ -1430,7 +3057,7 @@ async def approve_withdraw_callback(update: Update, context: ContextTypes.DEFAUL
     
     request_id = int(query.data.split("_")[-1])
     
-    db.update_withdraw_status(request_id, "approved")
+    await db.update_withdraw_status(request_id, "approved")
     
     # Get request details
     # Note: You would need to add a method to get withdraw request by ID
@@ -1453,7 +3080,7 @@ async def reject_withdraw_callback(update: Update, context: ContextTypes.DEFAULT
     
     request_id = int(query.data.split("_")[-1])
     
-    db.update_withdraw_status(request_id, "rejected")
+    await db.update_withdraw_status(request_id, "rejected")
     
     await query.answer("❌ Withdraw Rejected!")
     await query.edit_message_reply_markup(
@@ -1474,30 +3101,29 @@ async def profile_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await query.answer()
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     if not user_data:
         await query.answer("❌ প্রথমে /start করুন!", show_alert=True)
         return
     
-    correct_answers = db.get_user_correct_answers(user.id)
-    
-    text = (
-        f"👤 *Your Profile*\n\n"
-        f"🧑 Name: {escape_markdown(user_data['name'])}\n"
-        f"🆔 User ID: `{user.id}`\n"
-        f"💰 Balance: {format_balance(user_data['balance'])}\n"
-        f"👥 Total Referral: {user_data['referral_count']}\n"
-        f"🧠 Quiz Played: {user_data['quiz_played']}\n"
-        f"✅ Correct Answers: {correct_answers}\n"
-        f"📅 Join Date: {user_data['join_date']}"
+    text = render_message(
+        "profile",
+        name=user_data["name"],
+        user_id=user.id,
+        balance=format_balance(user_data["balance"]),
+        referral_count=user_data["referral_count"],
+        quiz_played=user_data["quiz_played"],
+        correct_answers=user_data["correct_answers"],
+        wrong_answers=user_data["wrong_answers"],
+        total_earned=format_balance(user_data["total_earned"]),
+        total_spent=format_balance(user_data["total_spent"]),
+        join_date=user_data["join_date"]
     )
     
     await query.edit_message_text(
         text,
         parse_mode=ParseMode.MARKDOWN_V2,
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
-        ])
+        reply_markup=STATIC_KEYBOARDS["back_menu"]
     )
 
 
@@ -1522,14 +3148,27 @@ async def admin_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     min_ref = int(db.get_setting("min_referral"))
     quiz_reward = float(db.get_setting("quiz_reward"))
     quiz_cost = float(db.get_setting("quiz_cost"))
-    total_users = db.get_total_users_count()
-    total_quiz = db.get_total_quiz_count()
+    stats = db.get_stats()
+    db_stats = db.stats()
+    avg_wait = escape_markdown(f"{db_stats['avg_wait_ms']:.1f}")
+    p95_wait = escape_markdown(f"{db_stats['p95_wait_ms']:.1f}")
+    user_cache = database.user_cache.stats()
+    user_hit_ratio = escape_markdown(f"{user_cache['hit_ratio'] * 100:.1f}")
     
     text = (
         f"⚙️ *Admin Panel*\n\n"
         f"📊 *Statistics:*\n"
-        f"👥 Total Users: {total_users}\n"
-        f"🧠 Total Quiz: {total_quiz}\n\n"
+        f"👥 Total Users: {int(stats.get(STAT_USERS, 0))}\n"
+        f"🚫 Banned Users: {int(stats.get(STAT_BANNED_USERS, 0))}\n"
+        f"📭 Undeliverable Users: {int(stats.get(STAT_UNDELIVERABLE, 0))}\n"
+        f"🧠 Total Quiz: {int(stats.get(STAT_QUIZZES, 0))}\n"
+        f"✍️ Total Answers: {int(stats.get(STAT_ANSWERS, 0))}\n"
+        f"⏳ Pending Withdraws: {int(stats.get(STAT_PENDING_WITHDRAWALS, 0))} "
+        f"\\({format_balance(stats.get(STAT_PENDING_WITHDRAW_AMOUNT, 0))}\\)\n"
+        f"💰 Total Balance: {format_balance(stats.get(STAT_TOTAL_BALANCE, 0))}\n"
+        f"🗄️ DB Queue Wait: {avg_wait}ms avg, {p95_wait}ms p95\n"
+        f"⚡ Settings Cache: {database.settings_hits} hits, {database.settings_loads} loads\n"
+        f"👤 User Cache: {user_hit_ratio}% hits, {user_cache['size']} users, {user_cache['memory_bytes'] // 1024} KB\n\n"
         f"💵 *Current Settings:*\n"
         f"💰 Min Withdraw: {format_balance(min_withdraw)}\n"
         f"💸 Withdraw Fee: {format_balance(withdraw_fee)}\n"
@@ -1548,6 +3187,7 @@ async def admin_panel_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         [InlineKeyboardButton("👤 User Management", callback_data="admin_user_mgmt")],
         [InlineKeyboardButton("💳 Balance Management", callback_data="admin_balance_mgmt")],
         [InlineKeyboardButton("📡 Broadcast", callback_data="admin_broadcast")],
+        [InlineKeyboardButton("📋 Broadcast Jobs", callback_data="admin_broadcast_jobs")],
         [InlineKeyboardButton("🔙 Back to Menu", callback_data="back_menu")]
     ]
     
@@ -1615,7 +3255,7 @@ async def admin_set_min_withdraw_handler(update: Update, context: ContextTypes.D
     """Handle min withdraw input"""
     try:
         amount = float(update.message.text.strip())
-        db.update_setting("min_withdraw", str(amount))
+        await db.update_setting("min_withdraw", str(amount))
         
         await update.message.reply_text(
             f"✅ *Minimum Withdraw Updated\\!*\n\nNew Value: {format_balance(amount)}",
@@ -1655,7 +3295,7 @@ async def admin_set_withdraw_fee_handler(update: Update, context: ContextTypes.D
     """Handle withdraw fee input"""
     try:
         amount = float(update.message.text.strip())
-        db.update_setting("withdraw_fee", str(amount))
+        await db.update_setting("withdraw_fee", str(amount))
         
         await update.message.reply_text(
             f"✅ *Withdraw Fee Updated\\!*\n\nNew Value: {format_balance(amount)}",
@@ -1727,7 +3367,7 @@ async def admin_set_ref_bonus_handler(update: Update, context: ContextTypes.DEFA
     """Handle referral bonus input"""
     try:
         amount = float(update.message.text.strip())
-        db.update_setting("referral_bonus", str(amount))
+        await db.update_setting("referral_bonus", str(amount))
         
         await update.message.reply_text(
             f"✅ *Referral Bonus Updated\\!*\n\nNew Value: {format_balance(amount)}",
@@ -1767,7 +3407,7 @@ async def admin_set_min_ref_handler(update: Update, context: ContextTypes.DEFAUL
     """Handle min referral input"""
     try:
         count = int(update.message.text.strip())
-        db.update_setting("min_referral", str(count))
+        await db.update_setting("min_referral", str(count))
         
         await update.message.reply_text(
             f"✅ *Minimum Referral Updated\\!*\n\nNew Value: {count}",
@@ -1839,7 +3479,7 @@ async def admin_set_quiz_reward_handler(update: Update, context: ContextTypes.DE
     """Handle quiz reward input"""
     try:
         amount = float(update.message.text.strip())
-        db.update_setting("quiz_reward", str(amount))
+        await db.update_setting("quiz_reward", str(amount))
         
         await update.message.reply_text(
             f"✅ *Quiz Reward Updated\\!*\n\nNew Value: {format_balance(amount)}",
@@ -1879,7 +3519,7 @@ async def admin_set_quiz_cost_handler(update: Update, context: ContextTypes.DEFA
     """Handle quiz cost input"""
     try:
         amount = float(update.message.text.strip())
-        db.update_setting("quiz_cost", str(amount))
+        await db.update_setting("quiz_cost", str(amount))
         
         await update.message.reply_text(
             f"✅ *Quiz Cost Updated\\!*\n\nNew Value: {format_balance(amount)}",
@@ -1904,7 +3544,7 @@ async def admin_channels_callback(update: Update, context: ContextTypes.DEFAULT_
     
     await query.answer()
     
-    channels = db.get_channels()
+    channels = await db.get_channels()
     
     text = "📢 *Channel Management*\n\n"
     
@@ -1954,7 +3594,9 @@ async def admin_add_channel_handler(update: Update, context: ContextTypes.DEFAUL
     try:
         channel_id = int(update.message.text.strip())
         
-        if db.add_channel(channel_id):
+        if await db.add_channel(channel_id):
+            membership_cache.invalidate_channel(channel_id)
+            await refresh_channel_invite_link(context.bot, channel_id)
             await update.message.reply_text(
                 f"✅ *Channel Added\\!*\n\nID: `{channel_id}`",
                 parse_mode=ParseMode.MARKDOWN_V2
@@ -1999,7 +3641,8 @@ async def admin_remove_channel_handler(update: Update, context: ContextTypes.DEF
     try:
         channel_id = int(update.message.text.strip())
         
-        if db.remove_channel(channel_id):
+        if await db.remove_channel(channel_id):
+            membership_cache.invalidate_channel(channel_id)
             await update.message.reply_text(
                 f"✅ *Channel Removed\\!*\n\nID: `{channel_id}`",
                 parse_mode=ParseMode.MARKDOWN_V2
@@ -2070,50 +3713,59 @@ async def admin_quiz_file_handler(update: Update, context: ContextTypes.DEFAULT_
         )
         return
     
-    # Download file
-    file = await document.get_file()
-    file_bytes = await file.download_as_bytearray()
+    status_msg = await update.message.reply_text(
+        "⏳ *Quiz Upload হচ্ছে\\.\\.\\.*",
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
     
-    content = file_bytes.decode('utf-8')
+    totals = {"inserted": 0, "rejected": 0, "duplicate": 0}
+    batch = []
+    processed = 0
+    last_progress = time.monotonic()
     
-    # Parse quizzes
-    quizzes = content.strip().split('---')
-    added_count = 0
+    async def flush_batch():
+        result = await db.add_quizzes(batch)
+        for key in totals:
+            totals[key] += result[key]
+        batch.clear()
     
-    for quiz_text in quizzes:
-        quiz_text = quiz_text.strip()
-        if not quiz_text:
-            continue
-        
-        lines = quiz_text.strip().split('\n')
-        
-        if len(lines) < 6:
-            continue
+    # Download to disk, then stream it block by block into batched inserts
+    file = await document.get_file()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = await file.download_to_drive(os.path.join(tmp_dir, "quiz.txt"))
         
-        try:
-            question = lines[0].strip()
-            options = []
-            correct = 1
-            
-            for line in lines[1:]:
-                line = line.strip()
-                if line.startswith('ANS:'):
-                    correct = int(line.split(':')[1].strip())
-                elif '|' in line:
-                    parts = line.split('|', 1)
-                    if len(parts) == 2:
-                        options.append(parts[1].strip())
-            
-            if len(options) == 4 and 1 <= correct <= 4:
-                db.add_quiz(question, options, correct)
-                added_count += 1
-        except Exception as e:
-            logger.error(f"Error parsing quiz: {e}")
-            continue
+        with open(path, encoding="utf-8") as quiz_file:
+            for quiz_text in iter_quiz_blocks(quiz_file):
+                processed += 1
+                quiz = parse_quiz_block(quiz_text)
+                if quiz:
+                    batch.append(quiz)
+                else:
+                    totals["rejected"] += 1
+                
+                if len(batch) >= QUIZ_IMPORT_BATCH_SIZE:
+                    await flush_batch()
+                
+                if time.monotonic() - last_progress >= QUIZ_IMPORT_PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    try:
+                        await status_msg.edit_text(
+                            f"⏳ *Quiz Upload হচ্ছে\\.\\.\\.*\n\n"
+                            f"📄 Processed: {processed}\n"
+                            f"📝 Added: {totals['inserted']}",
+                            parse_mode=ParseMode.MARKDOWN_V2
+                        )
+                    except Exception as e:
+                        logger.warning(f"Quiz upload progress edit failed: {e}")
+    
+    if batch:
+        await flush_batch()
     
-    await update.message.reply_text(
+    await status_msg.edit_text(
         f"✅ *Quiz Upload Complete\\!*\n\n"
-        f"📝 Added: {added_count} quizzes",
+        f"📝 Added: {totals['inserted']} quizzes\n"
+        f"♻️ Duplicate: {totals['duplicate']}\n"
+        f"❌ Rejected: {totals['rejected']}",
         parse_mode=ParseMode.MARKDOWN_V2
     )
 
@@ -2144,11 +3796,9 @@ async def admin_find_user_handler(update: Update, context: ContextTypes.DEFAULT_
     """Find user by ID"""
     try:
         user_id = int(update.message.text.strip())
-        user_data = db.get_user(user_id)
+        user_data = await db.get_user(user_id)
         
         if user_data:
-            correct_answers = db.get_user_correct_answers(user_id)
-            
             text = (
                 f"👤 *User Info*\n\n"
                 f"🧑 Name: {escape_markdown(user_data['name'])}\n"
@@ -2156,7 +3806,8 @@ async def admin_find_user_handler(update: Update, context: ContextTypes.DEFAULT_
                 f"💰 Balance: {format_balance(user_data['balance'])}\n"
                 f"👥 Referrals: {user_data['referral_count']}\n"
                 f"🧠 Quiz Played: {user_data['quiz_played']}\n"
-                f"✅ Correct: {correct_answers}\n"
+                f"✅ Correct: {user_data['correct_answers']}\n"
+                f"❌ Wrong: {user_data['wrong_answers']}\n"
                 f"📅 Join Date: {user_data['join_date']}"
             )
         else:
@@ -2228,7 +3879,7 @@ async def admin_add_balance_handler(update: Update, context: ContextTypes.DEFAUL
         user_id = int(parts[0])
         amount = float(parts[1])
         
-        if db.update_balance(user_id, amount):
+        if await db.update_balance(user_id, amount):
             await update.message.reply_text(
                 f"✅ *Balance Added\\!*\n\n"
                 f"👤 User ID: `{user_id}`\n"
@@ -2277,7 +3928,7 @@ async def admin_deduct_balance_handler(update: Update, context: ContextTypes.DEF
         user_id = int(parts[0])
         amount = float(parts[1])
         
-        if db.update_balance(user_id, -amount):
+        if await db.update_balance(user_id, -amount):
             await update.message.reply_text(
                 f"✅ *Balance Deducted\\!*\n\n"
                 f"👤 User ID: `{user_id}`\n"
@@ -2308,8 +3959,12 @@ async def admin_broadcast_callback(update: Update, context: ContextTypes.DEFAULT
     
     await query.answer()
     
+    stats = db.get_stats()
+    
     await query.edit_message_text(
         "📡 *Broadcast Message*\n\n"
+        f"📬 Reachable Users: {db.get_reachable_users_count()}\n"
+        f"📭 Undeliverable: {int(stats.get(STAT_UNDELIVERABLE, 0))}\n\n"
         "📝 যে Message সব Users কে পাঠাতে চান সেটি লিখুন\\:",
         parse_mode=ParseMode.MARKDOWN_V2,
         reply_markup=InlineKeyboardMarkup([
@@ -2325,57 +3980,132 @@ async def admin_broadcast_handler(update: Update, context: ContextTypes.DEFAULT_
     admin = update.effective_user
     message_text = update.message.text
     
-    # Get all users
-    users = db.get_all_users()
-    total = len(users)
+    # Store the broadcast as a job, then send it in the background
+    job_id = await db.create_broadcast_job(admin.id, message_text, db.get_reachable_users_count())
+    job = await db.get_broadcast_job(job_id)
     
     status_msg = await update.message.reply_text(
-        f"📡 *Broadcasting\\.\\.\\.*\n\n"
-        f"👥 Total Users: {total}\n"
-        f"✅ Sent: 0\n"
-        f"❌ Failed: 0",
-        parse_mode=ParseMode.MARKDOWN_V2
+        broadcast_job_text(job),
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=broadcast_job_keyboard(job_id, BROADCAST_RUNNING)
     )
+    start_broadcast_job(context.bot, job, status_msg)
     
-    sent = 0
-    failed = 0
+    return ConversationHandler.END
+
+
+async def admin_broadcast_jobs_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List recent broadcast jobs"""
+    query = update.callback_query
     
-    for user in users:
-        try:
-            await context.bot.send_message(
-                chat_id=user['user_id'],
-                text=message_text,
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-            sent += 1
-        except Exception:
-            failed += 1
-        
-        # Update status every 50 messages
-        if (sent + failed) % 50 == 0:
-            await status_msg.edit_text(
-                f"📡 *Broadcasting\\.\\.\\.*\n\n"
-                f"👥 Total Users: {total}\n"
-                f"✅ Sent: {sent}\n"
-                f"❌ Failed: {failed}",
-                parse_mode=ParseMode.MARKDOWN_V2
+    if not is_admin(query.from_user.id):
+        await query.answer("❌ Admin Only!", show_alert=True)
+        return
+    
+    await query.answer()
+    
+    jobs = await db.get_broadcast_jobs()
+    
+    text = "📋 *Broadcast Jobs*\n\n"
+    buttons = []
+    
+    if jobs:
+        for job in jobs:
+            text += (
+                f"• \\#{job['job_id']} {BROADCAST_STATUS_LABELS[job['status']]} "
+                f"{job['sent'] + job['failed']}/{job['total']}\n"
             )
-        
-        # Small delay to avoid rate limit
-        await asyncio.sleep(0.05)
+            buttons.append([InlineKeyboardButton(f"📡 Broadcast #{job['job_id']}", callback_data=f"bcast_view_{job['job_id']}")])
+    else:
+        text += "❌ No broadcasts yet!"
     
-    # Log broadcast
-    db.log_broadcast(admin.id, message_text, sent)
+    buttons.append([InlineKeyboardButton("🔙 Back to Admin", callback_data="admin_panel")])
     
-    await status_msg.edit_text(
-        f"✅ *Broadcast Complete\\!*\n\n"
-        f"👥 Total Users: {total}\n"
-        f"✅ Sent: {sent}\n"
-        f"❌ Failed: {failed}",
-        parse_mode=ParseMode.MARKDOWN_V2
+    await query.edit_message_text(
+        text,
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=InlineKeyboardMarkup(buttons)
     )
+
+
+async def broadcast_job_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show, pause, resume or cancel a broadcast job"""
+    query = update.callback_query
     
-    return ConversationHandler.END
+    if not is_admin(query.from_user.id):
+        await query.answer("❌ Admin Only!", show_alert=True)
+        return
+    
+    _, action, job_id = query.data.split("_")
+    job_id = int(job_id)
+    run = broadcast_runs.get(job_id)
+    
+    if action == "pause":
+        changed = await db.set_broadcast_job_status(job_id, BROADCAST_PAUSED, (BROADCAST_RUNNING,))
+        if changed and run:
+            run[1].stop()
+    elif action == "cancel":
+        changed = await db.set_broadcast_job_status(
+            job_id, BROADCAST_CANCELLED, (BROADCAST_RUNNING, BROADCAST_PAUSED)
+        )
+        if changed and run:
+            run[1].stop()
+    elif action == "resume":
+        if job_id in broadcast_tasks:
+            # The paused run is still writing its checkpoint
+            await query.answer("⏳ একটু পরে আবার চেষ্টা করুন!", show_alert=True)
+            return
+        changed = await db.set_broadcast_job_status(job_id, BROADCAST_RUNNING, (BROADCAST_PAUSED,))
+        if changed:
+            start_broadcast_job(context.bot, await db.get_broadcast_job(job_id), query.message)
+    else:
+        changed = True
+    
+    if not changed:
+        await query.answer("❌ এই Job এ এটি করা যাবে না!", show_alert=True)
+        return
+    
+    await query.answer()
+    
+    job = await db.get_broadcast_job(job_id)
+    if not job:
+        return
+    
+    try:
+        await query.edit_message_text(
+            broadcast_job_text(job),
+            parse_mode=ParseMode.MARKDOWN_V2,
+            reply_markup=broadcast_job_keyboard(job_id, job["status"])
+        )
+    except BadRequest as e:
+        # Refresh with nothing new to show
+        if "not modified" not in str(e).lower():
+            raise
+
+
+async def broadcasts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /broadcasts: live status of active broadcasts"""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    jobs = await db.get_broadcast_jobs(BROADCAST_RUNNING) + await db.get_broadcast_jobs(BROADCAST_PAUSED)
+    
+    if not jobs:
+        await update.message.reply_text(
+            "📭 *কোনো Broadcast চলছে না\\!*",
+            parse_mode=ParseMode.MARKDOWN_V2,
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📋 Broadcast Jobs", callback_data="admin_broadcast_jobs")]
+            ])
+        )
+        return
+    
+    for job in jobs:
+        await update.message.reply_text(
+            broadcast_job_text(job),
+            parse_mode=ParseMode.MARKDOWN_V2,
+            reply_markup=broadcast_job_keyboard(job["job_id"], job["status"])
+        )
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -2389,7 +4119,7 @@ async def back_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     await query.answer()
     
-    user_data = db.get_user(user.id)
+    user_data = await db.get_user(user.id)
     
     if not user_data:
         await query.edit_message_text(
@@ -2398,14 +4128,7 @@ async def back_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return
     
-    text = (
-        f"👋 *স্বাগতম আবার, {escape_markdown(user.full_name)}\\!*\n\n"
-        f"🔥 *Premium Quiz Earn Bot Main Menu*\n\n"
-        f"💰 Balance: {format_balance(user_data['balance'])}\n\n"
-        f"🧠 Quiz খেলে টাকা আয় করুন\n"
-        f"👥 Refer করে Bonus পান\n"
-        f"💰 Withdraw করুন সহজেই"
-    )
+    text = render_message("back_menu", name=user.full_name, balance=format_balance(user_data["balance"]))
     
     await query.edit_message_text(
         text,
@@ -2414,15 +4137,394 @@ async def back_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     )
 
 
+def ending_conversation(callback, *clear_keys: str):
+    """Fallback version of a menu handler: runs it, drops clear_keys from user_data and ends the conversation"""
+    async def fallback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        for key in clear_keys:
+            context.user_data.pop(key, None)
+        await callback(update, context)
+        return ConversationHandler.END
+    return fallback
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🔀 UPDATE PROCESSING
+# ═══════════════════════════════════════════════════════════════
+
+class UpdateQueue(asyncio.Queue):
+    """Update queue whose bound counts updates being processed as well as queued ones"""
+    
+    def __init__(self, maxsize: int = UPDATE_QUEUE_SIZE):
+        # With concurrent updates PTB moves every update off the queue into its own task at once,
+        # so a plain maxsize never fills. Here a slot is held from put until task_done (called by
+        # PTB once processing ends): webhook ingress gets QueueFull (503), polling's put() waits
+        super().__init__()
+        self.limit = maxsize
+        self.pending = 0
+        self.max_pending = 0
+        self._room = asyncio.Event()
+    
+    def full(self) -> bool:
+        return self.pending >= self.limit
+    
+    def put_nowait(self, item):
+        if self.full():
+            raise asyncio.QueueFull
+        super().put_nowait(item)
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+    
+    async def put(self, item):
+        while self.full():
+            self._room.clear()
+            await self._room.wait()
+        self.put_nowait(item)
+    
+    def task_done(self):
+        super().task_done()
+        self.pending -= 1
+        self._room.set()
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Concurrent update processing where each user's updates still run one at a time, in order"""
+    
+    def __init__(self, max_concurrent_updates: int = UPDATE_CONCURRENCY):
+        # process_update takes the base semaphore before do_process_update, so an update queued
+        # behind its user's lock would hold a global slot: leave that one unbounded and take a
+        # slot of our own only once the user's lock is held. Waiting tasks (and their locks) are
+        # bounded by UpdateQueue, which counts an update until its processing ends
+        super().__init__(sys.maxsize)
+        self._max_concurrent_updates = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # user_id -> [lock, updates holding or waiting for it]; dropped when the count hits 0
+        self._locks: Dict[int, list] = {}
+    
+    @asynccontextmanager
+    async def _serialized(self, user_id: Optional[int]):
+        """Hold the user's lock, then a processing slot; updates without a user only take the slot"""
+        if user_id is None:
+            async with self._slots:
+                yield
+            return
+        
+        entry = self._locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+    
+    async def do_process_update(self, update: object, coroutine) -> None:
+        """Run the handlers once every earlier update of the same user is done"""
+        user = update.effective_user if isinstance(update, Update) else None
+        async with self._serialized(user.id if user else None):
+            await coroutine
+    
+    async def initialize(self) -> None:
+        """Nothing to set up"""
+    
+    async def shutdown(self) -> None:
+        """Nothing to tear down"""
+
+
+# ═══════════════════════════════════════════════════════════════
+# 💾 PERSISTENCE
+# ═══════════════════════════════════════════════════════════════
+
+class SQLitePersistence(BasePersistence):
+    """user_data and conversation states in SQLite, loaded per user on first use, written in batches"""
+    
+    def __init__(self, update_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        # user_id -> None, LRU order; an evicted user is loaded again (missing keys only)
+        self._loaded: "OrderedDict[int, None]" = OrderedDict()
+        self._dirty_users: Dict[int, Dict] = {}
+        self._dropped_users = set()
+        self._dirty_conversations: Dict[Tuple[str, Tuple], object] = {}
+        self._writer: Optional[asyncio.Task] = None
+    
+    # Only user_data is stored; nothing is loaded eagerly at startup
+    async def get_user_data(self) -> Dict[int, Dict]:
+        return {}
+    
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+    
+    async def get_bot_data(self) -> Dict:
+        return {}
+    
+    async def get_callback_data(self) -> None:
+        return None
+    
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        """Open conversations; ended ones are deleted and abandoned ones expire after CONVERSATION_MAX_AGE"""
+        return await db.get_conversation_states(name)
+    
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        """Lazy load: fill user_data from SQLite the first time a user shows up"""
+        if user_id in self._loaded:
+            self._loaded.move_to_end(user_id)
+            return
+        self._loaded[user_id] = None
+        while len(self._loaded) > USER_CACHE_SIZE:
+            self._loaded.popitem(last=False)
+        if user_id in self._dirty_users or user_id in self._dropped_users:
+            return  # staged changes are newer than what is stored
+        
+        stored = await db.get_user_state(user_id)
+        for key, value in (stored or {}).items():
+            user_data.setdefault(key, value)
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+    
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
+    
+    # The application hands over dirty entries every update_interval; they are staged
+    # and written together by one task instead of one transaction per entry
+    async def update_user_data(self, user_id: int, data: Dict):
+        self._dropped_users.discard(user_id)
+        self._dirty_users[user_id] = data
+        self._schedule_write()
+    
+    async def drop_user_data(self, user_id: int):
+        self._dirty_users.pop(user_id, None)
+        self._dropped_users.add(user_id)
+        self._schedule_write()
+    
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]):
+        self._dirty_conversations[(name, key)] = new_state
+        self._schedule_write()
+    
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+    
+    async def drop_chat_data(self, chat_id: int):
+        pass
+    
+    async def update_bot_data(self, data: Dict):
+        pass
+    
+    async def update_callback_data(self, data):
+        pass
+    
+    def _schedule_write(self):
+        """Start the writer unless it is already running (it picks up new entries itself)"""
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write())
+    
+    async def _write(self):
+        """Write staged entries in batches until nothing is left"""
+        while self._dirty_users or self._dropped_users or self._dirty_conversations:
+            users, self._dirty_users = self._dirty_users, {}
+            dropped, self._dropped_users = self._dropped_users, set()
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            try:
+                await db.save_state(users, dropped, conversations)
+            except Exception as e:
+                logger.error(f"💾 Persistence write failed, keeping {len(users) + len(dropped)} users "
+                             f"and {len(conversations)} conversations for the next write: {e}")
+                self._restage(users, dropped, conversations)
+                return
+    
+    def _restage(self, users: Dict[int, Dict], dropped: Iterable[int], conversations: Dict[Tuple[str, Tuple], object]):
+        """Put a failed batch back; entries staged since then are newer and win"""
+        for user_id, data in users.items():
+            if user_id not in self._dirty_users and user_id not in self._dropped_users:
+                self._dirty_users[user_id] = data
+        for user_id in dropped:
+            if user_id not in self._dirty_users:
+                self._dropped_users.add(user_id)
+        for key, state in conversations.items():
+            self._dirty_conversations.setdefault(key, state)
+    
+    async def flush(self):
+        """Called on shutdown: wait for the writer and write whatever is left"""
+        if self._writer and not self._writer.done():
+            await self._writer
+        await self._write()
+
+
+# ═══════════════════════════════════════════════════════════════
+# 🌐 WEBHOOK SERVER
+# ═══════════════════════════════════════════════════════════════
+
+class WebhookServer:
+    """Minimal HTTP/1.1 endpoint feeding Telegram updates into the application's update queue"""
+    
+    REASONS = {
+        200: "OK",
+        400: "Bad Request",
+        403: "Forbidden",
+        404: "Not Found",
+        405: "Method Not Allowed",
+        413: "Payload Too Large",
+        503: "Service Unavailable"
+    }
+    
+    def __init__(self, application: Application, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                 host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT):
+        if not secret:
+            raise ValueError("WebhookServer needs a secret token")
+        self.application = application
+        self.path = path
+        self.secret = secret.encode()
+        self.host = host
+        self.port = port
+        self.responses: Dict[int, int] = {}
+        self._server = None
+        self._connections = set()
+    
+    async def start(self):
+        """Start listening; port 0 picks a free port"""
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+    
+    async def stop(self):
+        """Stop accepting and drop open keep-alive connections"""
+        if self._server:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+    
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """One connection; Telegram keeps these alive across many updates"""
+        self._connections.add(writer)
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+    
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Read one request and answer it, returns whether the connection stays open"""
+        request_line = await asyncio.wait_for(reader.readline(), WEBHOOK_IDLE_TIMEOUT)
+        if not request_line:
+            return False
+        method, target, version = request_line.decode("latin-1").split()
+        
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), WEBHOOK_IDLE_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        length = int(headers.get("content-length", "0"))
+        if length > WEBHOOK_MAX_BODY:
+            await self._respond(writer, 413, keep_alive=False)
+            return False
+        
+        body = await reader.readexactly(length) if length else b""
+        await self._respond(writer, self._accept(method, target, headers, body), keep_alive)
+        return keep_alive
+    
+    def _accept(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> int:
+        """Validate a request and queue its update, returns the HTTP status"""
+        if target.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        token = headers.get("x-telegram-bot-api-secret-token", "").encode()
+        if not hmac.compare_digest(token, self.secret):
+            return 403
+        
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception:
+            return 400
+        if update is None:
+            return 400
+        
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram retries later; better than buffering without limit
+            return 503
+        return 200
+    
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, keep_alive: bool):
+        """Write an empty-bodied response"""
+        self.responses[status] = self.responses.get(status, 0) + 1
+        lines = [
+            f"HTTP/1.1 {status} {self.REASONS[status]}",
+            "Content-Length: 0",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        if status == 503:
+            lines.append("Retry-After: 1")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+
+async def run_webhook(application: Application):
+    """Serve updates through WebhookServer until SIGINT / SIGTERM"""
+    stop_signal = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_signal.set)
+    
+    # Without a secret anyone who finds the URL can post forged updates (e.g. as ADMIN_ID)
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    server = WebhookServer(application, secret=secret)
+    
+    # run_polling calls the post_* hooks itself; with a manual lifecycle they are ours to call
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True
+        )
+        logger.info(f"🌐 Webhook listening on {server.host}:{server.port}{server.path}")
+        await stop_signal.wait()
+    finally:
+        await server.stop()
+        logger.info(f"🌐 Webhook responses: {server.responses}")
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
 # ═══════════════════════════════════════════════════════════════
 # 📂 MAIN APPLICATION SETUP
 # ═══════════════════════════════════════════════════════════════
 
-def setup_application() -> Application:
+def setup_application(bot=None) -> Application:
     """Setup and configure the bot application"""
     
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Create application (queued + in-flight updates are bounded: webhook ingress answers 503 when
+    # full; updates of different users run concurrently, one user's updates stay in order)
+    builder = (
+        Application.builder()
+        .update_queue(UpdateQueue(UPDATE_QUEUE_SIZE))
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+        .persistence(SQLitePersistence())
+    )
+    application = (builder.bot(bot) if bot else builder.token(BOT_TOKEN)).build()
     
     # ═══════════════════════════════════════════════════════════
     # CONVERSATION HANDLERS
@@ -2445,11 +4547,21 @@ def setup_application() -> Application:
                 CallbackQueryHandler(confirm_withdraw_callback, pattern="^confirm_withdraw$")
             ]
         },
+        # Leaving through the menu or /start ends the conversation instead of stranding it
         fallbacks=[
-            CallbackQueryHandler(cancel_withdraw_callback, pattern="^cancel_withdraw$")
+            CallbackQueryHandler(cancel_withdraw_callback, pattern="^cancel_withdraw$"),
+            CallbackQueryHandler(
+                ending_conversation(
+                    back_menu_callback, "withdraw_method", "withdraw_number", "withdraw_amount", "final_amount"
+                ),
+                pattern="^back_menu$"
+            ),
+            CommandHandler("start", ending_conversation(start_command))
         ],
         per_user=True,
-        per_chat=True
+        per_chat=True,
+        name="withdraw",
+        persistent=True
     )
     
     # Admin Settings Conversation Handlers
@@ -2507,20 +4619,39 @@ def setup_application() -> Application:
                 MessageHandler(filters.TEXT & ~filters.COMMAND, admin_deduct_balance_handler)
             ]
         },
+        # The Cancel/Back buttons of every prompt end the conversation
         fallbacks=[
-            CallbackQueryHandler(admin_panel_callback, pattern="^admin_panel$"),
-            CallbackQueryHandler(back_menu_callback, pattern="^back_menu$")
+            CallbackQueryHandler(ending_conversation(admin_panel_callback), pattern="^admin_panel$"),
+            CallbackQueryHandler(ending_conversation(back_menu_callback), pattern="^back_menu$"),
+            CallbackQueryHandler(
+                ending_conversation(admin_withdraw_settings_callback), pattern="^admin_withdraw_settings$"
+            ),
+            CallbackQueryHandler(
+                ending_conversation(admin_referral_settings_callback), pattern="^admin_referral_settings$"
+            ),
+            CallbackQueryHandler(ending_conversation(admin_quiz_settings_callback), pattern="^admin_quiz_settings$"),
+            CallbackQueryHandler(ending_conversation(admin_channels_callback), pattern="^admin_channels$"),
+            CallbackQueryHandler(ending_conversation(admin_balance_mgmt_callback), pattern="^admin_balance_mgmt$"),
+            CommandHandler("start", ending_conversation(start_command))
         ],
         per_user=True,
-        per_chat=True
+        per_chat=True,
+        name="admin_settings",
+        persistent=True
     )
     
     # ═══════════════════════════════════════════════════════════
     # ADD HANDLERS
     # ═══════════════════════════════════════════════════════════
     
+    # Conversation Handlers go first: the first matching handler of a group wins, and their
+    # menu fallbacks must see /start, back_menu and the Cancel buttons before the plain handlers
+    application.add_handler(withdraw_conv)
+    application.add_handler(admin_settings_conv)
+    
     # Command Handlers
     application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("broadcasts", broadcasts_command))
     
     # Callback Query Handlers
     application.add_handler(CallbackQueryHandler(verify_join_callback, pattern="^verify_join$"))
@@ -2537,14 +4668,12 @@ def setup_application() -> Application:
     application.add_handler(CallbackQueryHandler(admin_channels_callback, pattern="^admin_channels$"))
     application.add_handler(CallbackQueryHandler(admin_add_quiz_callback, pattern="^admin_add_quiz$"))
     application.add_handler(CallbackQueryHandler(admin_balance_mgmt_callback, pattern="^admin_balance_mgmt$"))
+    application.add_handler(CallbackQueryHandler(admin_broadcast_jobs_callback, pattern="^admin_broadcast_jobs$"))
+    application.add_handler(CallbackQueryHandler(broadcast_job_callback, pattern="^bcast_(view|pause|resume|cancel)_"))
     application.add_handler(CallbackQueryHandler(back_menu_callback, pattern="^back_menu$"))
     application.add_handler(CallbackQueryHandler(approve_withdraw_callback, pattern="^approve_withdraw_"))
     application.add_handler(CallbackQueryHandler(reject_withdraw_callback, pattern="^reject_withdraw_"))
     
-    # Conversation Handlers
-    application.add_handler(withdraw_conv)
-    application.add_handler(admin_settings_conv)
-    
     # Message Handler for Quiz File Upload
     application.add_handler(MessageHandler(filters.Document.TXT, admin_quiz_file_handler))
     
@@ -2559,6 +4688,49 @@ async def post_init(application: Application):
     ]
     await application.bot.set_my_commands(commands)
     logger.info("✅ Bot commands set!")
+    
+    # initialize() already fetched get_me, so the identity is known without another call
+    application.bot_data["referral_links"] = ReferralLinks(application.bot.username)
+    logger.info(f"✅ Bot identity: @{application.bot.username}")
+    
+    # Not application.create_task: those are awaited on stop, this loop never ends
+    application.bot_data["invite_link_refresher"] = asyncio.create_task(
+        invite_link_refresher(application.bot)
+    )
+    
+    # Jobs still marked running were interrupted (stop or crash): park all of them as paused,
+    # so any we fail to restart stay resumable from the admin panel, then resume from the checkpoint
+    for job in await db.pause_running_broadcast_jobs():
+        if await db.set_broadcast_job_status(job["job_id"], BROADCAST_RUNNING, (BROADCAST_PAUSED,)):
+            start_broadcast_job(application.bot, dict(job, status=BROADCAST_RUNNING))
+            logger.info(f"📡 Resuming broadcast #{job['job_id']} after user {job['cursor_user_id']}")
+
+
+async def post_stop(application: Application):
+    """Checkpoint running broadcasts; they stay running and resume on the next start"""
+    for _, engine in list(broadcast_runs.values()):
+        engine.stop()
+    if broadcast_tasks:
+        await asyncio.gather(*broadcast_tasks.values(), return_exceptions=True)
+
+
+async def post_shutdown(application: Application):
+    """Stop background tasks and release database resources"""
+    refresher = application.bot_data.get("invite_link_refresher")
+    if refresher:
+        refresher.cancel()
+    
+    db_stats = db.stats()
+    logger.info(
+        f"🗄️ DB queue: {db_stats['calls']} calls, avg wait {db_stats['avg_wait_ms']:.2f}ms, "
+        f"max wait {db_stats['max_wait_ms']:.2f}ms, max depth {db_stats['max_depth']}"
+    )
+    user_cache = database.user_cache.stats()
+    logger.info(
+        f"👤 User cache: {user_cache['hit_ratio'] * 100:.1f}% hits, {user_cache['size']} users, "
+        f"{user_cache['evictions']} evictions"
+    )
+    db.close()
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -2581,8 +4753,18 @@ def main():
     # Setup application
     application = setup_application()
     application.post_init = post_init
+    application.post_stop = post_stop
+    application.post_shutdown = post_shutdown
     
     # Run bot
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            logger.error("❌ BOT_MODE=webhook needs WEBHOOK_URL")
+            sys.exit(1)
+        logger.info("🤖 Bot starting (webhook)...")
+        asyncio.run(run_webhook(application))
+        return
+    
     logger.info("🤖 Bot starting...")
     application.run_polling(
         allowed_updates=Update.ALL_TYPES,